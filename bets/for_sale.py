@@ -0,0 +1,149 @@
+from collections import namedtuple
+from functools import lru_cache
+from math import comb
+from statistics import mean
+
+# For Sale, property phase: every round as many cards as players are revealed
+# and auctioned. Passing players take the lowest card left and get half their
+# bid back (rounded down); the last player in takes the top card and pays it all.
+DECK = tuple(range(1, 31))
+PLAYERS = 5
+START_COINS = 14
+
+# What one point of property face value is worth in coins at the end of the
+# game (checks run up to ~15k for the 30, coins are 1k each)
+COIN_PER_POINT = 0.5
+
+# Opponents are assumed to stay in an auction up to a maximum bid that is
+# uniformly distributed between 0 and this value
+OPPONENT_MAX_BID = 6
+
+
+# Knobs of the heuristic: score = top_delta + second_weight * second_delta
+# + spread_weight * spread, and the first threshold the score reaches picks
+# the matching bid
+HeuristicParams = namedtuple("HeuristicParams", ["second_weight", "spread_weight", "thresholds", "bids"])
+
+DEFAULT_HEURISTIC = HeuristicParams(0.5, 0.1, (12, 8, 4), (4, 2, 1))  # no 3: same refund as 2
+
+
+# Fast rule of thumb: compare the top cards on the table with the average of
+# the cards still to come
+def heuristic_bid(table_cards, seen_cards=[], params=DEFAULT_HEURISTIC):
+    if len(table_cards) != 5:
+        return "Error: Provide exactly 5 table cards for this round."
+
+    all_cards = set(range(1, 31))
+    unseen_cards = list(all_cards - set(seen_cards) - set(table_cards))
+
+    top = max(table_cards)
+    second = sorted(table_cards)[-2]
+    worst = min(table_cards)
+
+    unseen_avg = mean(unseen_cards) if unseen_cards else 15.5
+
+    top_delta = top - unseen_avg
+    second_delta = second - unseen_avg
+    spread = top - worst
+
+    score = top_delta + params.second_weight * second_delta + params.spread_weight * spread
+
+    for threshold, bid in zip(params.thresholds, params.bids):
+        if score >= threshold:
+            return bid
+    return 0
+
+
+# Coins actually spent when going up to `bid`: everything if we end up with
+# the top card, otherwise the bid minus the refund of half (rounded down)
+def bid_cost(bid, won):
+    return bid if won else bid - bid // 2
+
+
+# Probability of finishing at each position (0 = first to pass, takes the
+# lowest card; opponents = takes the top card) when we stay in up to `bid`.
+# Opponents whose maximum is below our bid pass before us, ties are broken at
+# random.
+@lru_cache(maxsize=None)
+def rank_distribution(bid, opponents=PLAYERS - 1, opponent_max=OPPONENT_MAX_BID):
+    p_below = min(bid, opponent_max + 1) / (opponent_max + 1)
+    p_tie = 1 / (opponent_max + 1) if bid <= opponent_max else 0.0
+    p_above = 1 - p_below - p_tie
+
+    dist = [0.0] * (opponents + 1)
+    for below in range(opponents + 1):
+        for tie in range(opponents - below + 1):
+            above = opponents - below - tie
+            p = (
+                comb(opponents, below) * comb(opponents - below, tie)
+                * p_below ** below * p_tie ** tie * p_above ** above
+            )
+            for beaten_ties in range(tie + 1):
+                dist[below + beaten_ties] += p / (tie + 1)
+    return tuple(dist)
+
+
+# Exact expected value of each order statistic (lowest first) of `size` cards
+# drawn without replacement from `cards`
+@lru_cache(maxsize=None)
+def expected_order_stats(cards, size):
+    cards = sorted(cards)
+    n = len(cards)
+    total = comb(n, size)
+    return tuple(
+        sum(cards[j] * comb(j, i) * comb(n - j - 1, size - i - 1) for j in range(n)) / total
+        for i in range(size)
+    )
+
+
+# Expected final money (property value plus coins left) for every bid on a
+# round with these cards (sorted, lowest first), followed by `rounds_left`
+# rounds whose tables are all valued as `future_cards`
+def _bid_values(cards, coins, future_cards, rounds_left, opponent_max):
+    opponents = len(cards) - 1
+    values = {}
+    for bid in range(coins + 1):
+        value = 0.0
+        for rank, p in enumerate(rank_distribution(bid, opponents, opponent_max)):
+            if p == 0:
+                continue
+            left = coins - bid_cost(bid, rank == opponents)
+            future = certainty_equivalent_value(future_cards, rounds_left, left, opponent_max)
+            value += p * (COIN_PER_POINT * cards[rank] + future)
+        values[bid] = value
+    return values
+
+
+# Approximate best final money from `rounds_left` future rounds, memoized on
+# (cards, rounds left, coins). This is a certainty-equivalent approximation,
+# not an expectation over the possible future tables: every future table is a
+# uniform sample of the unseen cards, so every future round is played on the
+# same table `cards`, the expected order statistics of that sample, and the
+# best bid is picked on that averaged table. The deck is not updated between
+# future rounds.
+@lru_cache(maxsize=100_000)
+def certainty_equivalent_value(cards, rounds_left, coins, opponent_max=OPPONENT_MAX_BID):
+    if rounds_left <= 0 or not cards:
+        return float(coins)
+    return max(_bid_values(cards, coins, cards, rounds_left - 1, opponent_max).values())
+
+
+# Expected final money for every possible bid this round
+def bid_values(table_cards, seen_cards=(), coins=START_COINS, opponent_max=OPPONENT_MAX_BID):
+    unseen = tuple(sorted(set(DECK) - set(seen_cards) - set(table_cards)))
+    rounds_left = len(unseen) // len(table_cards)
+    future_cards = expected_order_stats(unseen, len(table_cards)) if rounds_left else ()
+    return _bid_values(sorted(table_cards), coins, future_cards, rounds_left, opponent_max)
+
+
+# Recommended bid for this round. With the player's coins known the bid comes
+# from the expected-value solver (lowest bid among equally good ones, with
+# later rounds approximated as above);
+# without them it falls back to the heuristic.
+def recommend_bid(table_cards, seen_cards=[], coins=None, opponent_max=OPPONENT_MAX_BID):
+    if len(table_cards) != 5:
+        return "Error: Provide exactly 5 table cards for this round."
+    if coins is None:
+        return heuristic_bid(table_cards, seen_cards)
+    values = bid_values(table_cards, seen_cards, coins, opponent_max)
+    return max(values, key=lambda bid: (round(values[bid], 9), -bid))
@@ -0,0 +1,197 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+import numpy as np
+
+from for_sale import COIN_PER_POINT, DECK, DEFAULT_HEURISTIC, OPPONENT_MAX_BID, PLAYERS, START_COINS
+
+# Outcome distribution of one bid over all rollouts, in final money
+# (property value plus coins left at the end of the game)
+# ci_low / ci_high: 95% confidence interval of the mean
+# p_top: share of rollouts in which the bid takes the top card this round
+BidOutcome = namedtuple("BidOutcome", ["bid", "mean", "std", "ci_low", "ci_high", "p10", "p50", "p90", "p_top"])
+
+DEFAULT_BATCH = 20_000
+
+DECK_TOTAL = sum(DECK)
+
+
+# heuristic_bid from for_sale for a whole batch of game states in one call.
+# tables: (n, 5) table cards, seen: (n, 31) bool mask of cards seen in
+# earlier rounds, indexed by card value. Returns an (n,) int array of bids.
+def heuristic_bids(tables, seen, params=DEFAULT_HEURISTIC):
+    tables = np.sort(tables, axis=1)
+    known = seen.copy()
+    np.put_along_axis(known, tables, True, axis=1)
+    unseen_count = len(DECK) - np.count_nonzero(known, axis=1)
+    unseen_sum = DECK_TOTAL - known @ np.arange(len(DECK) + 1)
+    unseen_avg = np.where(unseen_count > 0, unseen_sum / np.maximum(unseen_count, 1), 15.5)
+
+    top, second, worst = tables[:, -1], tables[:, -2], tables[:, 0]
+    score = (top - unseen_avg) + params.second_weight * (second - unseen_avg) + params.spread_weight * (top - worst)
+    return np.select([score >= t for t in params.thresholds], list(params.bids), default=0)
+
+
+# Batch version of for_sale.heuristic_bid for plain lists of states:
+# table_cards[i] and seen_cards[i] describe state i
+def recommend_bids(table_cards, seen_cards, params=DEFAULT_HEURISTIC):
+    tables = np.asarray(table_cards)
+    if tables.ndim != 2 or tables.shape[1] != PLAYERS:
+        raise ValueError(f"Every state needs exactly {PLAYERS} table cards")
+    seen = np.zeros((len(tables), len(DECK) + 1), dtype=bool)
+    for i, cards in enumerate(seen_cards):
+        seen[i, list(cards)] = True
+    return heuristic_bids(tables, seen, params)
+
+
+# Policies decide the maximum bids of `count` players for a batch of rollouts
+# at once. tables: (n, players) sorted table cards, seen: (n, 31) bool mask of
+# cards seen in earlier rounds (indexed by card value). Returns an (n, count)
+# int array; the simulation caps every bid at the player's coins.
+# heuristic_policy wraps heuristic_bids (pass other params with functools.partial).
+def heuristic_policy(tables, seen, count, rng, params=DEFAULT_HEURISTIC):
+    return np.repeat(heuristic_bids(tables, seen, params)[:, None], count, axis=1)
+
+
+# The heuristic, off by one coin either way at random, so opponents don't all
+# bid in lockstep
+def noisy_heuristic_policy(tables, seen, count, rng):
+    bids = heuristic_policy(tables, seen, count, rng) + rng.integers(-1, 2, size=(len(tables), count))
+    return np.maximum(bids, 0)
+
+
+# The solver's opponent model: a uniform maximum bid between 0 and OPPONENT_MAX_BID
+def random_policy(tables, seen, count, rng):
+    return rng.integers(0, OPPONENT_MAX_BID + 1, size=(len(tables), count))
+
+
+POLICIES = {
+    "heuristic": heuristic_policy,
+    "noisy heuristic": noisy_heuristic_policy,
+    "random (solver model)": random_policy,
+}
+
+
+# Resolve one auction for every rollout: lowest maximum bid passes first and
+# takes the lowest card, ties are broken by `tie_break` (a random permutation
+# of 0..players-1 per rollout), and payments follow for_sale.bid_cost (the top
+# card pays the full bid, others half rounded up)
+def play_round(tables, bids, tie_break):
+    players = bids.shape[1]
+    # Position of each player = how many players pass before them. Counting
+    # comparisons column by column is much faster than argsort on short rows.
+    key = bids * players + tie_break
+    rank = np.zeros_like(key)
+    for p in range(players):
+        rank += key[:, p:p + 1] < key
+    cards = np.take_along_axis(tables, rank, axis=1)
+    won = rank == players - 1
+    cost = np.where(won, bids, bids - bids // 2)
+    return cards, cost, won
+
+
+# Play `size` rollouts of the rest of the game once for every bid in `bids`.
+# Deals, policy decisions and tie breaks don't depend on our first bid, so
+# they are drawn once and shared by all bids (common random numbers); only
+# the coins left differ. Module level so it can run in a worker process.
+def simulate_batch(table_cards, seen_cards, coins, opponent_coins, bids, size, seed,
+                   opponent_policy=noisy_heuristic_policy, player_policy=heuristic_policy):
+    players = len(table_cards)
+    rng = np.random.default_rng(seed)
+    unseen = np.array(sorted(set(DECK) - set(seen_cards) - set(table_cards)))
+    rounds_left = len(unseen) // players
+    deals = rng.permuted(np.tile(unseen, (size, 1)), axis=1)
+    rows = np.arange(size)[:, None]
+
+    seen = np.zeros((size, len(DECK) + 1), dtype=bool)
+    seen[:, list(seen_cards)] = True
+    rounds = []
+    for round_no in range(rounds_left + 1):
+        if round_no == 0:
+            tables = np.tile(sorted(table_cards), (size, 1))
+            own = None
+        else:
+            tables = np.sort(deals[:, (round_no - 1) * players:round_no * players], axis=1)
+            own = player_policy(tables, seen, 1, rng)[:, 0]
+        others = opponent_policy(tables, seen, players - 1, rng)
+        tie_break = rng.permuted(np.tile(np.arange(players), (size, 1)), axis=1)
+        rounds.append((tables, own, others, tie_break))
+        seen[rows, tables] = True
+
+    results = {}
+    for bid in bids:
+        money = np.zeros(size)
+        purse = np.tile([coins] + [opponent_coins] * (players - 1), (size, 1))
+        top = None
+        for tables, own, others, tie_break in rounds:
+            wanted = np.column_stack([np.full(size, bid) if own is None else own, others])
+            cards, cost, won = play_round(tables, np.minimum(wanted, purse), tie_break)
+            money += COIN_PER_POINT * cards[:, 0]
+            purse -= cost
+            if top is None:
+                top = won[:, 0]
+        results[bid] = (money + purse[:, 0], top)
+    return results
+
+
+def _summarize(bid, money, top):
+    mean = money.mean()
+    half_width = 1.96 * money.std(ddof=1) / np.sqrt(len(money)) if len(money) > 1 else 0.0
+    p10, p50, p90 = np.percentile(money, [10, 50, 90])
+    return BidOutcome(bid, mean, money.std(), mean - half_width, mean + half_width, p10, p50, p90, top.mean())
+
+
+# Split `total` rollouts into batches of at most batch_size and run
+# batch(size, seed) for each, with independent seeds spawned from `seed`,
+# optionally over a process pool (batch must then be picklable). Returns the
+# batch results in completion order; progress(done, total) is called after
+# every batch.
+def run_batches(batch, total, batch_size, workers=1, seed=None, progress=None):
+    sizes = [min(batch_size, total - start) for start in range(0, total, batch_size)]
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(len(sizes))]
+
+    parts = []
+    done = 0
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(batch, size, s): size for size, s in zip(sizes, seeds)}
+            for future in as_completed(futures):
+                parts.append(future.result())
+                done += futures[future]
+                if progress:
+                    progress(done, total)
+    else:
+        for size, s in zip(sizes, seeds):
+            parts.append(batch(size, s))
+            done += size
+            if progress:
+                progress(done, total)
+    return parts
+
+
+# Outcome distribution of every bid (0..coins by default) over `rollouts`
+# simulated games. Rollouts run in vectorized batches, optionally spread over
+# a process pool; progress(done, total) is called after every batch.
+def simulate_bids(table_cards, seen_cards=(), coins=START_COINS, bids=None, rollouts=100_000,
+                  opponent_policy=noisy_heuristic_policy, player_policy=heuristic_policy,
+                  opponent_coins=None, batch_size=DEFAULT_BATCH, workers=1, seed=None, progress=None):
+    if len(table_cards) != PLAYERS:
+        raise ValueError(f"Provide exactly {PLAYERS} table cards, got {len(table_cards)}")
+    bids = list(range(coins + 1)) if bids is None else list(bids)
+    opponent_coins = coins if opponent_coins is None else opponent_coins
+
+    batch = partial(
+        simulate_batch, tuple(table_cards), tuple(seen_cards), coins, opponent_coins, bids,
+        opponent_policy=opponent_policy, player_policy=player_policy,
+    )
+    parts = run_batches(batch, rollouts, batch_size, workers, seed, progress)
+
+    return [
+        _summarize(
+            bid,
+            np.concatenate([part[bid][0] for part in parts]),
+            np.concatenate([part[bid][1] for part in parts]),
+        )
+        for bid in bids
+    ]
@@ -0,0 +1,126 @@
+# Tournament between parameterized bidding policies: plays thousands of full
+# For Sale property phases (5 players, 30 cards, 6 rounds) in vectorized
+# batches, optionally across a process pool, and reports win rates, average
+# final money and timing per policy.
+#
+#   python for_sale_tournament.py --games 20000 --workers 4 \
+#       --policy "cautious=0.5,0.1,14,10,6" --policy "eager=0.5,0.1,10,6,2"
+import argparse
+import time
+from collections import namedtuple
+from functools import partial
+
+import numpy as np
+
+from for_sale import COIN_PER_POINT, DECK, DEFAULT_HEURISTIC, PLAYERS, START_COINS, HeuristicParams
+from for_sale_sim import heuristic_policy, noisy_heuristic_policy, play_round, random_policy, run_batches
+
+# wins: games won outright count 1, shared wins count 1 / number of winners
+PolicyStanding = namedtuple("PolicyStanding", ["name", "games", "wins", "win_rate", "mean_money"])
+
+
+# Play `games` complete games with policies[i] in seat i. Returns the final
+# money of every seat in every game as a (games, players) array.
+def play_games(policies, games, seed, coins=START_COINS):
+    players = len(policies)
+    rng = np.random.default_rng(seed)
+    deals = rng.permuted(np.tile(np.array(DECK), (games, 1)), axis=1)
+    rows = np.arange(games)[:, None]
+
+    money = np.zeros((games, players))
+    purse = np.full((games, players), coins)
+    seen = np.zeros((games, len(DECK) + 1), dtype=bool)
+    for start in range(0, len(DECK) - players + 1, players):
+        tables = np.sort(deals[:, start:start + players], axis=1)
+        bids = np.column_stack([policy(tables, seen, 1, rng)[:, 0] for policy in policies])
+        tie_break = rng.permuted(np.tile(np.arange(players), (games, 1)), axis=1)
+        cards, cost, _ = play_round(tables, np.minimum(bids, purse), tie_break)
+        money += COIN_PER_POINT * cards
+        purse -= cost
+        seen[rows, tables] = True
+    return money + purse
+
+
+# One batch of games, with seats rotated so every policy plays from every seat
+def _play_batch(lineup, games, seed):
+    policies = [policy for _, policy in lineup]
+    players = len(policies)
+    wins = np.zeros(players)
+    totals = np.zeros(players)
+    per_rotation = -(-games // players)
+    for shift in range(players):
+        order = [(i + shift) % players for i in range(players)]
+        result = play_games([policies[i] for i in order], per_rotation, [seed, shift])
+        best = result.max(axis=1, keepdims=True)
+        winners = result == best
+        share = winners / winners.sum(axis=1, keepdims=True)
+        for seat, i in enumerate(order):
+            wins[i] += share[:, seat].sum()
+            totals[i] += result[:, seat].sum()
+    return per_rotation * players, wins, totals
+
+
+# Run the tournament: `lineup` is a list of (name, policy) with one entry per
+# seat. Batches run in parallel when workers > 1.
+def run_tournament(lineup, games=10_000, batch_size=2_000, workers=1, seed=None):
+    if len(lineup) != PLAYERS:
+        raise ValueError(f"Need exactly {PLAYERS} policies, got {len(lineup)}")
+    parts = run_batches(partial(_play_batch, lineup), games, batch_size, workers, seed)
+
+    played = 0
+    wins = np.zeros(len(lineup))
+    totals = np.zeros(len(lineup))
+    for batch_games, batch_wins, batch_totals in parts:
+        played += batch_games
+        wins += batch_wins
+        totals += batch_totals
+
+    return [
+        PolicyStanding(name, played, wins[i], wins[i] / played, totals[i] / played)
+        for i, (name, _) in enumerate(lineup)
+    ]
+
+
+# "name=second_weight,spread_weight,t1,t2,t3" -> heuristic policy with bids 4, 2, 1
+def parse_policy(spec):
+    name, _, values = spec.partition("=")
+    numbers = [float(x) for x in values.split(",")]
+    if len(numbers) != 5:
+        raise argparse.ArgumentTypeError(f"Expected name=second_weight,spread_weight,t1,t2,t3, got {spec!r}")
+    params = HeuristicParams(numbers[0], numbers[1], tuple(numbers[2:]), DEFAULT_HEURISTIC.bids)
+    return name, partial(heuristic_policy, params=params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tournament between For Sale bidding policies")
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=2_000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--policy", type=parse_policy, action="append", default=[],
+                        help="heuristic variant as name=second_weight,spread_weight,t1,t2,t3")
+    args = parser.parse_args()
+
+    # Fill the remaining seats with the current heuristic and its noisy and random rivals
+    fillers = [
+        ("heuristic", heuristic_policy),
+        ("noisy heuristic", noisy_heuristic_policy),
+        ("random", random_policy),
+        ("heuristic #2", heuristic_policy),
+        ("noisy heuristic #2", noisy_heuristic_policy),
+    ]
+    lineup = (args.policy + fillers)[:PLAYERS]
+
+    start = time.perf_counter()
+    standings = run_tournament(lineup, args.games, args.batch_size, args.workers, args.seed)
+    elapsed = time.perf_counter() - start
+
+    games = standings[0].games
+    print(f"{games:,} games in {elapsed:.2f}s ({games / elapsed:,.0f} games/s)")
+    print(f"{'policy':<22}{'win rate':>10}{'mean money':>12}")
+    for s in sorted(standings, key=lambda s: -s.win_rate):
+        print(f"{s.name:<22}{s.win_rate:>10.1%}{s.mean_money:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
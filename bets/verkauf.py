@@ -1,33 +1,9 @@
 import streamlit as st
-from statistics import mean
+import os
+import pandas as pd
 
-def recommend_bid(table_cards, seen_cards=[]):
-    if len(table_cards) != 5:
-        return "Error: Provide exactly 5 table cards for this round."
-
-    all_cards = set(range(1, 31))
-    unseen_cards = list(all_cards - set(seen_cards) - set(table_cards))
-
-    top = max(table_cards)
-    second = sorted(table_cards)[-2]
-    worst = min(table_cards)
-
-    unseen_avg = mean(unseen_cards) if unseen_cards else 15.5
-
-    top_delta = top - unseen_avg
-    second_delta = second - unseen_avg
-    spread = top - worst
-
-    score = top_delta + 0.5 * second_delta + 0.1 * spread
-
-    if score >= 12:
-        return 4
-    elif score >= 8:
-        return 2  # Avoid 3 due to same refund
-    elif score >= 4:
-        return 1
-    else:
-        return 0
+from for_sale import START_COINS, bid_values, recommend_bid
+from for_sale_sim import POLICIES, simulate_bids
 
 # Streamlit app
 st.set_page_config(page_title="For Sale Bid Advisor", page_icon="🏠")
@@ -38,6 +14,7 @@ st.markdown("Enter the 5 property cards revealed this round and any cards alread
 # Input: current table cards
 table_cards = st.text_input("Cards this round (5 cards, comma-separated)", "4, 9, 17, 21, 28")
 seen_cards = st.text_input("Seen cards (comma-separated)", "1, 3, 6, 8, 10, 12, 14")
+coins = st.number_input("Your coins", min_value=0, max_value=START_COINS, value=START_COINS, step=1)
 
 try:
     table_list = sorted([int(x.strip()) for x in table_cards.split(",") if x.strip()])
@@ -46,7 +23,31 @@ try:
     if len(table_list) != 5:
         st.error("Please enter exactly 5 cards for the current round.")
     else:
-        bid = recommend_bid(table_list, seen_list)
+        bid = recommend_bid(table_list, seen_list, coins=int(coins))
         st.success(f"💡 Recommended Bid: **{bid}**")
+
+        # Expected final money (property value + coins left) for each bid
+        values = bid_values(table_list, seen_list, coins=int(coins))
+        st.caption("Expected final money for each bid (property value plus coins left)")
+        st.bar_chart({"Expected value": values})
+
+        # Monte Carlo check against simulated opponents over random deals
+        with st.expander("Simulate opponents"):
+            policy_name = st.selectbox("Opponents play", list(POLICIES), index=1)
+            rollouts = st.select_slider("Rollouts", options=[10_000, 50_000, 100_000, 200_000], value=100_000)
+            workers = st.number_input("Worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1, step=1)
+            if st.button("Run simulation"):
+                sim_prog = st.progress(0.0)
+                outcomes = simulate_bids(
+                    table_list, seen_list, coins=int(coins), rollouts=rollouts,
+                    opponent_policy=POLICIES[policy_name], workers=int(workers),
+                    progress=lambda done, total: sim_prog.progress(done / total),
+                )
+                best = max(outcomes, key=lambda o: o.mean)
+                st.success(f"Best simulated bid: **{best.bid}** (expected {best.mean:.1f})")
+                st.dataframe(
+                    pd.DataFrame(outcomes).set_index("bid").style.format("{:.2f}"),
+                    use_container_width=True,
+                )
 except ValueError:
     st.error("Please enter valid integers separated by commas.")
@@ -0,0 +1,224 @@
+import itertools
+from collections import namedtuple
+from functools import lru_cache
+from math import comb, factorial
+
+import numpy as np
+
+from shared_cache import LRUCache
+
+# numbers: every number a pair of dice can add up to (2 .. 2 * sides)
+# gather: one row per distinct roll (multiset of faces), one boolean column per number
+# weights: how many ordered rolls each multiset stands for
+# total: number of ordered rolls, i.e. sides ** dice
+RollTable = namedtuple("RollTable", ["dice", "sides", "numbers", "faces", "gather", "weights", "total"])
+
+# Largest number of distinct rolls a table may have. 6d20 (177,100 rolls) still
+# fits; 8d20 (2.2M) would need gigabytes for the combo scores.
+MAX_ROLLS = 200_000
+
+
+# All ways to split the given dice positions into pairs, e.g. for 4 dice:
+# ((0, 1), (2, 3)), ((0, 2), (1, 3)), ((0, 3), (1, 2))
+def pair_partitions(positions):
+    positions = tuple(positions)
+    if not positions:
+        yield ()
+        return
+    first, rest = positions[0], positions[1:]
+    for i, partner in enumerate(rest):
+        remaining = rest[:i] + rest[i + 1:]
+        for partition in pair_partitions(remaining):
+            yield ((first, partner),) + partition
+
+
+# Every pair of dice positions that appears in some pair partition, i.e. the
+# pairs whose sum can be gathered from a roll
+@lru_cache(maxsize=None)
+def gatherable_pairs(dice):
+    return tuple(sorted({pair for partition in pair_partitions(range(dice)) for pair in partition}))
+
+
+# Mark which numbers each roll can gather: one row per roll in faces, one
+# boolean column per number 2 .. 2 * sides
+def gatherable(faces, sides):
+    gather = np.zeros((len(faces), 2 * sides - 1), dtype=bool)
+    rows = np.arange(len(faces))
+    for i, j in gatherable_pairs(faces.shape[1]):
+        gather[rows, faces[:, i] + faces[:, j] - 2] = True
+    return gather
+
+
+# Number of distinct rolls (multisets of faces) of a (dice, sides) configuration
+def roll_count(dice, sides):
+    return comb(sides + dice - 1, dice)
+
+
+# Build the gatherable table for a (dice, sides) configuration, counting each
+# multiset of faces once instead of enumerating all sides ** dice rolls
+@lru_cache(maxsize=8)
+def roll_table(dice=4, sides=6):
+    if dice < 2 or dice % 2:
+        raise ValueError(f"Need an even number of dice (at least 2), got {dice}")
+    if sides < 1:
+        raise ValueError(f"Need at least one side per die, got {sides}")
+    if roll_count(dice, sides) > MAX_ROLLS:
+        raise ValueError(
+            f"{dice}d{sides} has {roll_count(dice, sides):,} distinct rolls, the limit is {MAX_ROLLS:,}"
+        )
+
+    faces = np.array(
+        list(itertools.combinations_with_replacement(range(1, sides + 1), dice)),
+        dtype=np.int16,
+    )
+    # Number of ordered rolls per multiset: dice! / prod(count of each face)!
+    factorials = np.array([factorial(k) for k in range(dice + 1)], dtype=np.int64)
+    weights = np.full(len(faces), factorials[dice], dtype=np.int64)
+    for face in range(1, sides + 1):
+        weights //= factorials[np.count_nonzero(faces == face, axis=1)]
+
+    numbers = list(range(2, 2 * sides + 1))
+    gather = gatherable(faces, sides)
+
+    faces.setflags(write=False)
+    gather.setflags(write=False)
+    weights.setflags(write=False)
+    return RollTable(dice, sides, numbers, faces, gather, weights, sides ** dice)
+
+
+# Rolls are scored in slices of this many rows, which bounds the temporary
+# matrices whatever the dice / sides setting
+CHUNK_ROWS = 65536
+
+
+# Weighted pair counts of a gather matrix: counts[a, b] is the number of
+# ordered rolls that can gather both number a and number b. Integer weights
+# summed in float64 stay exact (6d20 has 6.4e7 ordered rolls).
+def weighted_pair_counts(gather, weights):
+    counts = np.zeros((gather.shape[1], gather.shape[1]))
+    for start in range(0, len(gather), CHUNK_ROWS):
+        chunk = gather[start:start + CHUNK_ROWS].astype(np.float64)
+        counts += (chunk * weights[start:start + CHUNK_ROWS, None]).T @ chunk
+    return counts
+
+
+# Number of ordered rolls that can gather every number of a set, for all sets
+# of `order` numbers at once: an (n,), (n, n) or (n, n, n) array indexed by
+# number - 2. Triplets are counted one first number at a time, over the rows
+# that can gather it.
+@lru_cache(maxsize=32)
+def gather_counts(dice, sides, order):
+    table = roll_table(dice, sides)
+    if order == 1:
+        counts = table.weights @ table.gather
+    elif order == 2:
+        counts = np.rint(weighted_pair_counts(table.gather, table.weights)).astype(np.int64)
+    elif order == 3:
+        counts = np.zeros((len(table.numbers),) * 3, dtype=np.int64)
+        for a in range(len(table.numbers)):
+            rows = table.gather[:, a]
+            counts[a] = np.rint(weighted_pair_counts(table.gather[rows], table.weights[rows]))
+    else:
+        raise ValueError(f"Combos of up to 3 numbers are supported, got {order}")
+    counts.setflags(write=False)
+    return counts
+
+
+# Function to calculate combo probabilities AND number frequencies.
+# Returns the combos sorted by probability, a numeric matrix with one row per
+# combo and columns P, P^2, ..., P^pow_max, and the single number probabilities.
+def calc_probs(combos, table, pow_max=10):
+    if not combos:
+        return [], np.zeros((0, pow_max)), {n: 0.0 for n in table.numbers}
+
+    # A roll succeeds for a combo if it can gather any of the combo's numbers.
+    # By inclusion-exclusion that count is the alternating sum, over the
+    # combo's non-empty subsets, of the rolls that gather the whole subset, so
+    # no (rolls x combos) matrix is ever built
+    first = table.numbers[0]
+    success_counts = np.zeros(len(combos), dtype=np.int64)
+    for size in sorted({len(combo) for combo in combos}):
+        rows = np.array([i for i, combo in enumerate(combos) if len(combo) == size])
+        columns = np.array([combos[i] for i in rows]) - first
+        for order in range(1, size + 1):
+            counts = gather_counts(table.dice, table.sides, order)
+            sign = 1 if order % 2 else -1
+            for subset in itertools.combinations(range(size), order):
+                success_counts[rows] += sign * counts[tuple(columns[:, subset].T)]
+
+    # A gatherable number always makes its combo a success, so each number
+    # counts once per roll that can gather it, for every combo containing it
+    combo_numbers = np.concatenate([np.asarray(combo) - first for combo in combos])
+    number_hits = gather_counts(table.dice, table.sides, 1) * np.bincount(
+        combo_numbers, minlength=len(table.numbers)
+    )
+
+    # Sort by probability (stable, so ties keep their combination order) and
+    # raise every probability to all powers at once
+    probs = success_counts / table.total
+    order = np.argsort(-probs, kind="stable")
+    powers = probs[order, None] ** np.arange(1, pow_max + 1)
+
+    # Normalize single number hits
+    number_probs = {n: number_hits[i] / table.total for i, n in enumerate(table.numbers)}
+
+    return [combos[i] for i in order], powers, number_probs
+
+
+# Filtered combo results, shared by every session in the process
+result_cache = LRUCache(maxsize=256)
+
+
+# Every combo of comb_size numbers for a (dice, sides) configuration, scored
+# once and sorted by probability. index[num] marks the rows whose combo
+# contains num, so include/exclude filters are just intersections of these
+# columns. Only the size the page asks for is built.
+ComboTable = namedtuple("ComboTable", ["combos", "powers", "index", "number_counts", "total"])
+
+
+@lru_cache(maxsize=32)
+def combo_table(dice=4, sides=6, comb_size=3, pow_max=10):
+    table = roll_table(dice, sides)
+    combos = list(itertools.combinations(table.numbers, comb_size))
+    combos, powers, _ = calc_probs(combos, table, pow_max)
+
+    members = np.array(combos)
+    index = {num: (members == num).any(axis=1) for num in table.numbers}
+    for column in [powers, *index.values()]:
+        column.setflags(write=False)
+
+    # Weighted number of rolls that can gather each number
+    number_counts = gather_counts(dice, sides, 1)
+    return ComboTable(tuple(combos), powers, index, number_counts, table.total)
+
+
+# Filtered combos, their P..P^pow_max matrix and the single number
+# probabilities for one page selection, picked out of the precomputed combo
+# table and cached per selection
+def combo_results(dice, sides, comb_size, must_include=(), must_exclude=(), pow_max=10):
+    must_include = tuple(sorted(set(must_include)))
+    must_exclude = tuple(sorted(set(must_exclude)))
+    key = (dice, sides, comb_size, must_include, must_exclude, pow_max)
+
+    def compute():
+        table = combo_table(dice, sides, comb_size, pow_max)
+        selected = np.ones(len(table.combos), dtype=bool)
+        for num in must_include:
+            if num not in table.index:
+                selected = np.zeros_like(selected)
+                break
+            selected = selected & table.index[num]
+        for num in must_exclude:
+            if num in table.index:
+                selected = selected & ~table.index[num]
+
+        rows = np.flatnonzero(selected)
+        powers = table.powers[rows]
+        powers.setflags(write=False)
+        number_probs = {
+            num: table.number_counts[i] * np.count_nonzero(table.index[num] & selected) / table.total
+            for i, num in enumerate(table.index)
+        }
+        return tuple(table.combos[i] for i in rows), powers, number_probs
+
+    return result_cache.get_or_compute(key, compute)
@@ -1,7 +1,10 @@
 import streamlit as st
-import itertools
+import os
 import pandas as pd
 
+from dice_engine import MAX_ROLLS, combo_results, result_cache, roll_count, roll_table
+from dice_simulation import binomial_at_least, simulate_combo
+
 st.set_page_config(layout="wide")
 
 st.markdown("""
@@ -21,25 +24,20 @@ st.markdown("""
   #  "Adjust filters to explore different combinations."
 #)
 
-# All possible 4d6 rolls
-all_rolls = list(itertools.product(range(1, 7), repeat=4))
-
-# For each roll, determine the possible numbers that can be gathered
-roll_to_gather = []
-for roll in all_rolls:
-    a, b, c, d = roll
-    pairs = [
-        (a + b, c + d),
-        (a + c, b + d),
-        (a + d, b + c)
-    ]
-    gatherable = set()
-    for p in pairs:
-        gatherable.add(p[0])
-        gatherable.add(p[1])
-    roll_to_gather.append(gatherable)
-
-all_numbers = list(range(2, 13))
+# Dice setup: the classic game is 4d6, house variants can use more dice or sides
+dice_count = st.sidebar.selectbox("Number of dice", options=[2, 4, 6, 8], index=1)
+dice_sides = st.sidebar.number_input("Sides per die", min_value=2, max_value=20, value=6, step=1)
+
+# Every distinct roll is kept in memory, so very large setups (e.g. 8d20) are refused
+if roll_count(dice_count, int(dice_sides)) > MAX_ROLLS:
+    st.error(
+        f"{dice_count}d{int(dice_sides)} has {roll_count(dice_count, int(dice_sides)):,} distinct rolls, "
+        f"more than the {MAX_ROLLS:,} this page can score. Use fewer dice or sides."
+    )
+    st.stop()
+
+# Gatherable numbers for every distinct roll, built once per process per (dice, sides)
+all_numbers = roll_table(dice_count, int(dice_sides)).numbers
 
 # Sidebar filters
 combo_type = st.radio(
@@ -60,70 +58,39 @@ must_exclude = st.sidebar.multiselect(
     default=[]
 )
 
-# Build and filter combinations
+# Filtered combos and their probabilities, shared by every session in the process
 comb_size = 2 if combo_type.startswith("Pairs") else 3
-combos = list(itertools.combinations(all_numbers, comb_size))
-
-if must_include:
-    combos = [
-        combo for combo in combos
-        if all(num in combo for num in must_include)
-    ]
-
-if must_exclude:
-    combos = [
-        combo for combo in combos
-        if all(num not in combo for num in must_exclude)
-    ]
-
-# Function to calculate combo probabilities AND number frequencies
-def calc_probs(combos, roll_to_gather, all_rolls, pow_max=10):
-    results = []
-    number_hits = {n: 0 for n in all_numbers}
-
-    for combo in combos:
-        success_count = 0
-        for gatherable in roll_to_gather:
-            if any(num in gatherable for num in combo):
-                success_count += 1
-                for num in combo:
-                    if num in gatherable:
-                        number_hits[num] += 1
-        prob = success_count / len(all_rolls)
-        row = [combo, prob] + [prob ** n for n in range(2, pow_max + 1)]
-        results.append(row)
-
-    results.sort(key=lambda x: -x[1])
-
-    # Normalize single number hits
-    total_rolls = len(all_rolls)
-    number_probs = {n: number_hits[n] / total_rolls for n in all_numbers}
-
-    return results, number_probs
-
-# Compute results and dynamic single number probabilities
-results, number_probs = calc_probs(combos, roll_to_gather, all_rolls,pow_max = 20)
+combos, powers, number_probs = combo_results(
+    dice_count, int(dice_sides), comb_size, must_include, must_exclude, pow_max=20
+)
 
 # Format and display single number probabilities
 st.sidebar.markdown("### Dynamic Single Number Probabilities")
 df_single = pd.DataFrame({
     "Number": list(number_probs.keys()),
-    "P": [f"{p:.1f}" for p in number_probs.values()]
+    "P": list(number_probs.values())
 })
-st.sidebar.dataframe(df_single.set_index("Number"), use_container_width=True, height=420)
+st.sidebar.dataframe(
+    df_single.set_index("Number").style.format("{:.1f}"),
+    use_container_width=True,
+    height=420
+)
 
-# Format results into DataFrame
-columns = ["Numbers", "P"] + [f"P^{i}" for i in range(2, 21)]
-df = pd.DataFrame(results, columns=columns)
+cache_stats = result_cache.stats()
+st.sidebar.caption(
+    f"Result cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+    f"{cache_stats['size']}/{cache_stats['maxsize']} entries"
+)
 
-# Clean display
-df["Numbers"] = df["Numbers"].apply(lambda x: ", ".join(map(str, x)))
-for col in df.columns[1:]:
-    df[col] = df[col].apply(lambda x: f"{x:.2f}")
+# Results stay numeric (so columns sort by value); rounding and the gradient
+# are only applied by the Styler at display time
+prob_columns = ["P"] + [f"P^{i}" for i in range(2, 21)]
+df = pd.DataFrame(powers, columns=prob_columns)
+df.insert(0, "Numbers", [", ".join(map(str, combo)) for combo in combos])
 
 # Show main table
-styled_df = df.style.background_gradient(
-    subset=df.columns[1:],  # Apply to P, P^2, ..., P^15
+styled_df = df.style.format("{:.2f}", subset=prob_columns).background_gradient(
+    subset=prob_columns,  # Apply to P, P^2, ..., P^20
     cmap="Greens",
     axis=None,
     gmap=None
@@ -131,3 +98,36 @@ styled_df = df.style.background_gradient(
 
 st.dataframe(styled_df, use_container_width=True, height=700)
 #st.dataframe(df.reset_index(drop=True), use_container_width=True, height=700)
+
+# Multi-turn strategies: chance of hitting a combo at least k times in n turns
+with st.expander("Simulate a strategy over several turns"):
+    if not combos:
+        st.info("No combinations match the current filters.")
+    else:
+        labels = [", ".join(map(str, combo)) for combo in combos]
+        sim_col1, sim_col2, sim_col3 = st.columns(3)
+        with sim_col1:
+            sim_label = st.selectbox("Combination", labels)
+            sim_turns = st.number_input("Turns (n)", min_value=1, max_value=100, value=10, step=1)
+        with sim_col2:
+            sim_at_least = st.number_input("Hit at least (k)", min_value=0, max_value=int(sim_turns), value=1, step=1)
+            sim_trials = st.select_slider("Simulated games", options=[10_000, 100_000, 1_000_000, 5_000_000], value=1_000_000)
+        with sim_col3:
+            sim_workers = st.number_input("Worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1, step=1)
+            sim_confidence = st.selectbox("Confidence", [0.90, 0.95, 0.99], index=1)
+
+        if st.button("Run simulation"):
+            sim_combo = combos[labels.index(sim_label)]
+            sim_prog = st.progress(0.0)
+            sim = simulate_combo(
+                sim_combo, int(sim_turns), int(sim_at_least), trials=sim_trials,
+                dice=dice_count, sides=int(dice_sides), workers=int(sim_workers),
+                confidence=sim_confidence,
+                progress=lambda done, total: sim_prog.progress(done / total),
+            )
+            exact = binomial_at_least(powers[labels.index(sim_label), 0], int(sim_turns), int(sim_at_least))
+            st.success(
+                f"P(at least {int(sim_at_least)} hits in {int(sim_turns)} turns) ≈ {sim.estimate:.4f} "
+                f"({sim.confidence:.0%} CI {sim.low:.4f} – {sim.high:.4f}, {sim.trials:,} games)"
+            )
+            st.caption(f"Exact value from the table above: {exact:.4f}")
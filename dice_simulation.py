@@ -0,0 +1,89 @@
+import math
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from dice_engine import gatherable_pairs
+
+# estimate: share of trials that hit the combo at least `at_least` times in `turns` turns
+# low / high: Wilson score confidence interval around the estimate
+SimulationResult = namedtuple("SimulationResult", ["estimate", "low", "high", "hits", "trials", "confidence"])
+
+# Rolls drawn per batch (trials * turns); keeps each batch at a few tens of MB
+DEFAULT_BATCH_ROLLS = 2_000_000
+
+Z_SCORES = {0.90: 1.6449, 0.95: 1.9600, 0.99: 2.5758}
+
+
+# Wilson score interval for a binomial proportion
+def wilson_interval(hits, trials, confidence=0.95):
+    if trials == 0:
+        return 0.0, 1.0
+    z = Z_SCORES[confidence]
+    p = hits / trials
+    denom = 1 + z ** 2 / trials
+    centre = (p + z ** 2 / (2 * trials)) / denom
+    margin = z * math.sqrt(p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)) / denom
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+# Exact P(at least k successes in n turns) for a per-turn success probability p
+def binomial_at_least(p, turns, at_least):
+    return sum(math.comb(turns, i) * p ** i * (1 - p) ** (turns - i) for i in range(at_least, turns + 1))
+
+
+# Simulate one batch of trials and return how many of them reached the target.
+# Module level so it can be shipped to worker processes.
+def _simulate_batch(combo, turns, at_least, trials, dice, sides, seed):
+    rng = np.random.default_rng(seed)
+    faces = rng.integers(1, sides + 1, size=(trials, turns, dice), dtype=np.int8)
+
+    # Same pairing rule as the exact tables: a turn succeeds if any gatherable
+    # pair sum is one of the combo's numbers
+    wanted = np.zeros(2 * sides + 1, dtype=bool)
+    wanted[list(combo)] = True
+    turn_hits = np.zeros((trials, turns), dtype=bool)
+    for i, j in gatherable_pairs(dice):
+        turn_hits |= wanted[faces[:, :, i] + faces[:, :, j]]
+
+    return int(np.count_nonzero(turn_hits.sum(axis=1) >= at_least))
+
+
+# Estimate the probability of hitting `combo` at least `at_least` times in
+# `turns` turns. Trials are split into batches that are drawn in one NumPy call
+# each, optionally spread over a process pool. progress(done, total) is called
+# after every finished batch.
+def simulate_combo(combo, turns, at_least=1, trials=1_000_000, dice=4, sides=6,
+                   workers=1, seed=None, confidence=0.95, batch_rolls=DEFAULT_BATCH_ROLLS,
+                   progress=None):
+    if turns < 1:
+        raise ValueError(f"Need at least one turn, got {turns}")
+    if not 0 <= at_least <= turns:
+        raise ValueError(f"at_least must be between 0 and {turns}, got {at_least}")
+    if confidence not in Z_SCORES:
+        raise ValueError(f"confidence must be one of {sorted(Z_SCORES)}, got {confidence}")
+
+    batch_trials = max(1, batch_rolls // turns)
+    sizes = [min(batch_trials, trials - start) for start in range(0, trials, batch_trials)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(tuple(combo), turns, at_least, size, dice, sides, s) for size, s in zip(sizes, seeds)]
+
+    hits = done = 0
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_simulate_batch, *job): job[3] for job in jobs}
+            for future in as_completed(futures):
+                hits += future.result()
+                done += futures[future]
+                if progress:
+                    progress(done, trials)
+    else:
+        for job in jobs:
+            hits += _simulate_batch(*job)
+            done += job[3]
+            if progress:
+                progress(done, trials)
+
+    low, high = wilson_interval(hits, trials, confidence)
+    return SimulationResult(hits / trials if trials else 0.0, low, high, hits, trials, confidence)
@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
 from datetime import datetime
 import os
-import subprocess
+import uuid
+
+import interview_db
+import interview_query
+import interview_writeback
 
 # Use st.write with HTML and CSS to set the width
 st.write("""
@@ -21,24 +24,32 @@ st.write('<div class="full-width">Your content here</div>', unsafe_allow_html=Tr
 customers_csv_path = 'customers.csv'
 orders_csv_path = 'orders.csv'
 
-# Load data from CSV files
-customers_df = pd.read_csv(customers_csv_path)
-orders_df = pd.read_csv(orders_csv_path, parse_dates=[0])
-
-# Initialize the in-memory SQLite database
-conn = sqlite3.connect(':memory:')
-customers_df.to_sql('customers', conn, if_exists='replace', index=False)
-orders_df.to_sql('orders', conn, if_exists='replace', index=False)
-
-# Function to save the DataFrame back to CSV and commit to GitHub
-def save_to_csv_and_commit(df, csv_path):
-    df.to_csv(csv_path, index=False)
-    try:
-        subprocess.run(['git', 'add', csv_path], check=True)
-        subprocess.run(['git', 'commit', '-m', f'Update {csv_path}'], check=True)
-        subprocess.run(['git', 'push'], check=True)
-    except subprocess.CalledProcessError as e:
-        st.error(f'Error during Git operations: {e}')
+# Limits for the SQL Test query runner
+MAX_ROWS = 10_000
+QUERY_TIMEOUT = 5  # seconds
+PAGE_SIZE = 100
+
+# The CSVs are loaded into a persistent, indexed SQLite file once per process
+# (and again only when a CSV changes); each session keeps its own connection
+# to it, see interview_db.py
+
+# Admin changes are exported to the CSVs and committed to GitHub by a
+# background worker, which batches changes made within a few seconds of each
+# other into a single commit
+writeback = interview_writeback.get_worker(
+    interview_db.DB_PATH, {'customers': customers_csv_path, 'orders': orders_csv_path}
+)
+
+# Refreshes on its own so the admin sees the commit finish without rerunning the page
+@st.fragment(run_every=2)
+def show_writeback_status():
+    status = writeback.status()
+    if status['state'] == 'error':
+        st.error(f"Error during Git operations: {status['last_error']}")
+    elif status['state'] in ('pending', 'writing'):
+        st.info(f"Saving changes to {', '.join(status['pending'])}...")
+    elif status['last_commit']:
+        st.caption(f"Changes committed ({status['last_commit']}) at {status['updated']}")
 
 # Dictionary to store usernames and passwords
 users = {
@@ -75,6 +86,7 @@ if not st.session_state.logged_in:
         if authenticate(username, password):
             st.session_state.logged_in = True
             st.session_state.username = username
+            st.session_state.session_id = uuid.uuid4().hex[:12]
             st.success('Logged in successfully')
         else:
             st.error('Invalid username or password')
@@ -82,31 +94,103 @@ else:
     st.write(f'Welcome, {st.session_state.username}!')
     st.write('You are a data analyst at an e-commerce company. Your manager has asked you to analyze the orders placed by customers in the North America region. You need to identify the most recent order for each customer in North America and provide details about the customer and their order.')
     st.write('The data is stored in the tables named **customers** and **orders**.')
+    # Only admin changes are written back. Everyone else reads the shared data
+    # until their first modifying query, which moves them to a private sandbox.
+    is_admin = st.session_state.username == "admin"
+    conn = interview_db.session_connection(st.session_state, readonly=not is_admin)
+    version = interview_db.session_version(st.session_state)
+    sandbox = None if is_admin else interview_db.sandboxes.get(st.session_state.session_id, version)
+
     # Input for SQL query
     query = st.text_area('Enter your SQL query here:', 'SELECT * FROM customers')
 
-    # Execute the query and display the result
+    # Execute the query: rows are fetched in chunks up to MAX_ROWS, long
+    # queries are stopped after QUERY_TIMEOUT seconds and read-only results
+    # are cached per dataset version (unless they ran on a changed copy)
     if st.button('Run Query'):
         try:
-            result = pd.read_sql_query(query, conn)
-            st.write(result)
-            st.write(query)
-            
-            # Save changes to the database back to CSV if modifying queries are detected
-            if query.strip().lower().startswith(('update', 'delete', 'insert')):
-                customers_df_updated = pd.read_sql_query('SELECT * FROM customers', conn)
-                orders_df_updated = pd.read_sql_query('SELECT * FROM orders', conn)
-                if username == "admin":
-                    save_to_csv_and_commit(customers_df_updated, customers_csv_path)
-                    save_to_csv_and_commit(orders_df_updated, orders_csv_path)
+            if not is_admin and sandbox is None and not interview_query.is_read_only(query):
+                sandbox = interview_db.sandboxes.create(st.session_state.session_id, conn, version)
+            shared = not is_admin and sandbox is None
+            # Admin statements run in a transaction on the shared file, so
+            # nothing reaches the candidates unless it is committed below
+            if is_admin:
+                conn.execute('BEGIN')
+            try:
+                result = interview_query.run_query(
+                    sandbox or conn, query, version=version if shared else None,
+                    max_rows=MAX_ROWS, timeout=QUERY_TIMEOUT
+                )
+            except Exception:
+                if is_admin:
+                    conn.rollback()
+                raise
+            st.session_state.query_result = (query, result)
+            st.session_state.result_page = 1
+            interview_query.log_query(st.session_state.username, st.session_state.session_id, query, result)
+
+            # Keep and queue for write-back only changes the CSV export can
+            # carry (UPDATE / INSERT / REPLACE / DELETE on a data table); DDL
+            # and everything else is rolled back
+            if is_admin:
+                changed = interview_writeback.modified_tables(query, writeback.tables)
+                if changed:
+                    conn.commit()
+                    writeback.submit(changed)
+                else:
+                    conn.rollback()
+                    if not interview_query.is_read_only(query):
+                        st.warning('Only UPDATE, INSERT and DELETE on customers or orders are saved; '
+                                   'this statement was rolled back.')
+        except interview_query.QueryTimeout as e:
+            st.session_state.query_result = None
+            interview_query.log_query(st.session_state.username, st.session_state.session_id, query, error=e)
+            st.error(f'Error: {e}. Try narrowing the query down.')
         except Exception as e:
+            st.session_state.query_result = None
+            interview_query.log_query(st.session_state.username, st.session_state.session_id, query, error=e)
             st.error(f'Error: {e}')
 
+    # Display the last result one page at a time, with its profile next to it
+    if st.session_state.get('query_result'):
+        last_query, result = st.session_state.query_result
+        result_col, profile_col = st.columns([3, 1])
+        with result_col:
+            if result.columns:
+                page_count = max(1, -(-len(result.rows) // PAGE_SIZE))
+                page = st.number_input('Page', min_value=1, max_value=page_count, step=1, key='result_page')
+                start = (page - 1) * PAGE_SIZE
+                page_rows = result.rows[start:start + PAGE_SIZE]
+                st.dataframe(pd.DataFrame(page_rows, columns=interview_query.unique_columns(result.columns)), use_container_width=True)
+                shown = f'Rows {start + 1}–{start + len(page_rows)} of {len(result.rows)}' if page_rows else 'No rows'
+                if result.truncated:
+                    shown += f' (result cut off at {MAX_ROWS} rows)'
+                st.caption(shown)
+            else:
+                st.write(f'{result.rowcount} row(s) affected')
+            st.write(last_query)
+        with profile_col:
+            st.markdown('**Query profile**')
+            st.write(f'Time: {result.elapsed * 1000:.1f} ms' + (' (cached)' if result.cached else ''))
+            st.write(f'Rows: {len(result.rows)}' + ('+' if result.truncated else ''))
+            st.write(f'VM steps: ~{result.vm_steps:,}')
+            if result.plan:
+                st.code(interview_query.format_plan(result.plan), language='text')
+
+    if is_admin:
+        show_writeback_status()
+    elif sandbox is not None:
+        st.caption('You are working on your own copy of the data; your changes are only visible to you.')
+        if st.button('Reset data'):
+            interview_db.sandboxes.drop(st.session_state.session_id)
+            st.session_state.query_result = None
+            st.rerun()
+
     # Logout button
     if st.button('Logout'):
         st.session_state.logged_in = False
         st.session_state.username = None
+        st.session_state.query_result = None
+        interview_db.sandboxes.drop(st.session_state.session_id)
+        interview_db.close_session_connection(st.session_state)
         st.success('Logged out successfully')
-
-# Close the connection when done
-conn.close()
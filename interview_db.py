@@ -0,0 +1,335 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import pandas as pd
+
+# Persistent SQLite copy of the interview CSVs, with typed columns and
+# indexes. It is built once and only rebuilt when the content of one of the
+# CSV files changes.
+DB_PATH = 'interview_data.sqlite'
+
+# Bump when the table layout below changes, so existing database files and
+# sidecars are rebuilt even though the CSVs did not change
+SCHEMA_VERSION = 2
+
+# Dates are written as dd.mm.YYYY in the CSVs and stored as ISO text in
+# SQLite, which sorts correctly and works with SQLite's date functions
+CSV_DATE_FORMAT = '%d.%m.%Y %H:%M:%S'
+SQL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Parsed tables are cached next to the database as Parquet files named after
+# the CSV content hash, so an unchanged CSV is never parsed twice
+SIDECAR_DIR = '.interview_cache'
+
+# csv_path: source CSV
+# dtypes: pandas dtypes for pd.read_csv (nullable, so admin edits may leave gaps)
+# columns: SQL column definitions, in CSV column order
+# dates: columns holding CSV_DATE_FORMAT timestamps
+TableSpec = namedtuple('TableSpec', ['csv_path', 'dtypes', 'columns', 'dates'])
+
+TABLES = {
+    'customers': TableSpec(
+        'customers.csv',
+        {'customer_id': 'Int64', 'customer_name': 'string', 'customer_region': 'string'},
+        ['customer_id INTEGER', 'customer_name TEXT', 'customer_region TEXT'],
+        [],
+    ),
+    'orders': TableSpec(
+        'orders.csv',
+        {'order_id': 'Int64', 'customer_id': 'Int64', 'order_date': 'string', 'total_amount': 'Int64'},
+        ['order_id INTEGER', 'customer_id INTEGER', 'order_date TEXT', 'total_amount INTEGER'],
+        ['order_date'],
+    ),
+}
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_customers_customer_id ON customers (customer_id)',
+    'CREATE INDEX IF NOT EXISTS idx_orders_customer_id ON orders (customer_id)',
+    'CREATE INDEX IF NOT EXISTS idx_orders_order_date ON orders (order_date)',
+]
+
+_lock = threading.Lock()
+_file_hashes = {}  # path -> (mtime_ns, size, sha256)
+_built_version = {}  # db path -> dataset version it was last built from
+
+
+# Content hash of a file, only re-read when its mtime or size changes
+def file_hash(path):
+    stat = os.stat(path)
+    cached = _file_hashes.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    _file_hashes[path] = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+    return digest.hexdigest()
+
+
+# One version string for the whole dataset
+def dataset_version(tables=TABLES):
+    digest = hashlib.sha256()
+    digest.update(f'schema:{SCHEMA_VERSION};'.encode())
+    for name, spec in sorted(tables.items()):
+        digest.update(f'{name}:{file_hash(spec.csv_path)};'.encode())
+    return digest.hexdigest()[:16]
+
+
+# Reformat date strings with an explicit format (much faster than letting
+# pandas guess); values that don't match are kept as they are
+def _convert_dates(values, from_format, to_format):
+    parsed = pd.to_datetime(values, format=from_format, errors='coerce')
+    return parsed.dt.strftime(to_format).astype('string').where(parsed.notna(), values)
+
+
+# An integer column parsed from CSV text. SQLite keeps whatever an admin edit
+# stores, so a fractional value (total_amount * 1.1) keeps the column float,
+# and text that isn't a number leaves it as text for SQLite's INTEGER affinity
+# to convert value by value, instead of failing the whole rebuild.
+def _read_integers(values):
+    numbers = pd.to_numeric(values, errors='coerce')
+    if numbers.notna().sum() < values.notna().sum():
+        return values
+    if (numbers.dropna() % 1 == 0).all():
+        return numbers.astype('Int64')
+    return numbers
+
+
+# The same column on its way back to CSV: whole numbers are written without a
+# trailing .0 (pandas reads an integer column with NULLs as float) and gaps as
+# empty fields, so an edit only changes the lines it touched
+def _write_integers(values):
+    numbers = pd.to_numeric(values, errors='coerce')
+    if numbers.notna().sum() == values.notna().sum() and (numbers.dropna() % 1 == 0).all():
+        return numbers.astype('Int64')
+    whole = [int(v) if isinstance(v, float) and v.is_integer() else v for v in values]
+    return pd.Series(whole, index=values.index, dtype=object)
+
+
+# Parse a table's CSV with explicit dtypes and date format, reusing the
+# Parquet sidecar when the CSV content has not changed since it was written
+def load_table(name, tables=TABLES):
+    spec = tables[name]
+    stem = f'{name}.{SCHEMA_VERSION}'
+    sidecar = os.path.join(SIDECAR_DIR, f'{stem}.{file_hash(spec.csv_path)[:16]}.parquet')
+    if os.path.exists(sidecar):
+        try:
+            return pd.read_parquet(sidecar)
+        except (ImportError, OSError, ValueError):
+            pass  # no Parquet engine or unreadable file, parse the CSV instead
+
+    integers = [column for column, dtype in spec.dtypes.items() if dtype == 'Int64']
+    df = pd.read_csv(spec.csv_path, dtype={**spec.dtypes, **{column: 'string' for column in integers}})
+    for column in integers:
+        df[column] = _read_integers(df[column])
+    for column in spec.dates:
+        df[column] = _convert_dates(df[column], CSV_DATE_FORMAT, SQL_DATE_FORMAT)
+
+    # Several app processes can parse the same CSV at once: each writes its
+    # own temp file and only stale sidecars (not someone's temp file) go
+    tmp_path = f'{sidecar}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        os.makedirs(SIDECAR_DIR, exist_ok=True)
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, sidecar)
+        for old in os.listdir(SIDECAR_DIR):
+            if old.startswith(f'{name}.') and old.endswith('.parquet') and os.path.join(SIDECAR_DIR, old) != sidecar:
+                try:
+                    os.remove(os.path.join(SIDECAR_DIR, old))
+                except FileNotFoundError:
+                    pass  # another process removed it first
+    except ImportError:
+        pass  # Parquet needs pyarrow; without it every rebuild parses the CSV
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df
+
+
+# Write a table back to its CSV in the original layout (dates as dd.mm.YYYY).
+# The file is written next to the CSV and swapped in, so a concurrent rerun
+# never hashes or parses a half-written file.
+def export_csv(conn, name, csv_path=None, tables=TABLES):
+    spec = tables[name]
+    df = pd.read_sql_query(f'SELECT * FROM "{name}"', conn)
+    for column, dtype in spec.dtypes.items():
+        if column in df.columns and dtype == 'Int64':
+            df[column] = _write_integers(df[column])
+    for column in spec.dates:
+        if column in df.columns:
+            df[column] = _convert_dates(df[column].astype('string'), SQL_DATE_FORMAT, CSV_DATE_FORMAT)
+    path = csv_path or spec.csv_path
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Export tables of the database to their CSVs (csv_paths overrides the paths
+# in `tables`) and record the resulting dataset version as the one the
+# database holds. The new CSVs came from the database, so ensure_database must
+# not rebuild from them: a rebuild would drop admin edits to other tables whose
+# export is still pending. Returns the new version.
+def export_tables(names, db_path=DB_PATH, tables=TABLES, csv_paths=None):
+    csv_paths = csv_paths or {}
+    with _lock:
+        conn = sqlite3.connect(db_path)
+        try:
+            for name in names:
+                export_csv(conn, name, csv_paths.get(name), tables)
+            version = dataset_version(tables)
+            conn.execute("UPDATE _meta SET value = ? WHERE key = 'version'", (version,))
+            conn.commit()
+        finally:
+            conn.close()
+        _built_version[db_path] = version
+        return version
+
+
+def _stored_version(db_path):
+    if not os.path.exists(db_path):
+        return None
+    try:
+        with sqlite3.connect(f'file:{db_path}?mode=ro', uri=True) as conn:
+            row = conn.execute("SELECT value FROM _meta WHERE key = 'version'").fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+# Load every CSV into a fresh database file, then swap it in atomically so
+# sessions that still have the old file open keep reading a consistent copy
+def _build(db_path, tables, version):
+    tmp_path = f'{db_path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        try:
+            for name, spec in tables.items():
+                conn.execute(f'CREATE TABLE "{name}" ({", ".join(spec.columns)})')
+                load_table(name, tables).to_sql(name, conn, if_exists='append', index=False, chunksize=50_000)
+            for statement in INDEXES:
+                conn.execute(statement)
+            conn.execute('CREATE TABLE _meta (key TEXT PRIMARY KEY, value TEXT)')
+            conn.execute("INSERT INTO _meta VALUES ('version', ?)", (version,))
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, db_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Make sure the database file matches the current CSVs and return its version
+def ensure_database(db_path=DB_PATH, tables=TABLES):
+    with _lock:
+        version = dataset_version(tables)
+        if _built_version.get(db_path) == version and os.path.exists(db_path):
+            return version
+        if _stored_version(db_path) != version:
+            _build(db_path, tables, version)
+        _built_version[db_path] = version
+        return version
+
+
+def connect(db_path=DB_PATH, readonly=True):
+    if readonly:
+        return sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+    return sqlite3.connect(db_path, check_same_thread=False)
+
+
+# Reuse one connection per session (state is e.g. st.session_state) and only
+# reopen it when the dataset was rebuilt or the access mode changed
+def session_connection(state, readonly=True, db_path=DB_PATH, tables=TABLES):
+    version = ensure_database(db_path, tables)
+    cached = state.get('db_connection')
+    if cached and cached[:2] == (version, readonly):
+        return cached[2]
+    if cached:
+        cached[2].close()
+    conn = connect(db_path, readonly)
+    state['db_connection'] = (version, readonly, conn)
+    return conn
+
+
+def close_session_connection(state):
+    cached = state.get('db_connection')
+    if cached:
+        cached[2].close()
+        state['db_connection'] = None
+
+
+# Dataset version the session's connection was opened on
+def session_version(state):
+    cached = state.get('db_connection')
+    return cached[0] if cached else None
+
+
+# Candidates' writable copies of the dataset. A session reads the shared file
+# until its first modifying query; only then is the database copied into a
+# private in-memory sandbox with SQLite's backup API. Sandboxes that sit idle
+# are closed, and the least recently used ones go first when there are too many.
+SANDBOX_IDLE_SECONDS = 15 * 60
+MAX_SANDBOXES = 50
+
+
+class SandboxPool:
+    def __init__(self, idle_seconds=SANDBOX_IDLE_SECONDS, max_sandboxes=MAX_SANDBOXES):
+        self.idle_seconds = idle_seconds
+        self.max_sandboxes = max_sandboxes
+        self._sandboxes = OrderedDict()  # session id -> (version, connection, last used)
+        self._lock = threading.Lock()
+
+    # The session's sandbox, or None if it has none for this dataset version
+    def get(self, session_id, version):
+        with self._lock:
+            self._evict_idle()
+            entry = self._sandboxes.get(session_id)
+            if entry is None:
+                return None
+            if entry[0] != version:
+                self._close(session_id)
+                return None
+            self._sandboxes[session_id] = (version, entry[1], time.monotonic())
+            self._sandboxes.move_to_end(session_id)
+            return entry[1]
+
+    def create(self, session_id, base_conn, version):
+        sandbox = sqlite3.connect(':memory:', check_same_thread=False)
+        base_conn.backup(sandbox)
+        with self._lock:
+            if session_id in self._sandboxes:
+                self._close(session_id)
+            self._sandboxes[session_id] = (version, sandbox, time.monotonic())
+            while len(self._sandboxes) > self.max_sandboxes:
+                self._close(next(iter(self._sandboxes)))
+        return sandbox
+
+    def drop(self, session_id):
+        with self._lock:
+            if session_id in self._sandboxes:
+                self._close(session_id)
+
+    def __len__(self):
+        return len(self._sandboxes)
+
+    def _close(self, session_id):
+        self._sandboxes.pop(session_id)[1].close()
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for session_id in [s for s, entry in self._sandboxes.items() if entry[2] < cutoff]:
+            self._close(session_id)
+
+
+sandboxes = SandboxPool()
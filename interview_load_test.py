@@ -0,0 +1,197 @@
+# Load test for interview_app.py: drives N concurrent headless sessions with
+# Streamlit's AppTest. Each session logs in, runs a mix of representative
+# queries and logs out. Reports latency percentiles per step, throughput and
+# memory growth per session.
+#
+# AppTest keeps global runtime state and can't run several sessions in one
+# process at once, so every session gets its own process. They still share the
+# database file, the query log and the machine, like a real cohort does, but
+# not the in-process result caches. Sessions run in a scratch copy of the data,
+# so the test never touches the live database, query log or CSVs; the admin
+# user (whose changes are committed and pushed) is refused.
+#
+#   python interview_load_test.py --sessions 20 --rounds 3
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+from threading import BrokenBarrierError
+
+from streamlit.testing.v1 import AppTest
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, 'interview_app.py')
+DATA_FILES = ['customers.csv', 'orders.csv']
+
+# Seconds the sessions get for their warm-up run on top of --timeout before
+# the start is called off
+START_GRACE = 60
+
+QUERY_MIX = [
+    'SELECT * FROM customers',
+    'SELECT * FROM orders ORDER BY order_date DESC',
+    "SELECT customer_region, COUNT(*), SUM(total_amount) FROM customers c "
+    "JOIN orders o ON o.customer_id = c.customer_id GROUP BY customer_region",
+    # the task itself: most recent order per North American customer
+    "SELECT c.customer_id, c.customer_name, o.order_id, o.order_date, o.total_amount "
+    "FROM customers c JOIN orders o ON o.customer_id = c.customer_id "
+    "WHERE c.customer_region = 'North America' AND o.order_date = "
+    "(SELECT MAX(order_date) FROM orders o2 WHERE o2.customer_id = c.customer_id)",
+    'SELECT * FROM orders CROSS JOIN customers',
+    # modifying query, moves the session to its own sandbox
+    'UPDATE orders SET total_amount = total_amount + 1 WHERE order_id % 7 = 0',
+]
+
+
+# Resident memory of this process in bytes (Linux), 0 where unavailable
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    low, high = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def _timed(timings, step, fn):
+    start = time.perf_counter()
+    fn()
+    timings.setdefault(step, []).append(time.perf_counter() - start)
+
+
+def _button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+# One simulated candidate: login, `rounds` random queries, logout. Returns the
+# step timings, errors and how much the process grew while the session ran.
+def run_session(username, password, rounds, seed, timeout, workdir, barrier=None):
+    # The app opens its CSVs and database relative to the working directory
+    os.chdir(workdir)
+    rng = random.Random(seed)
+    timings = {}
+    errors = []
+    # Warm-up run so Streamlit and the app's imports aren't counted as load
+    # time. A failing session breaks the barrier so nobody waits for it.
+    try:
+        AppTest.from_file(APP_PATH, default_timeout=timeout).run()
+    except Exception:
+        if barrier is not None:
+            barrier.abort()
+        raise
+    if barrier is not None:
+        barrier.wait(timeout + START_GRACE)  # start every session at the same moment
+    rss_start = rss_bytes()
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    _timed(timings, 'load', at.run)
+    at.text_input[0].input(username)
+    at.text_input[1].input(password)
+    _timed(timings, 'login', lambda: _button(at, 'Login').click().run())
+    at.run()
+
+    for _ in range(rounds):
+        at.text_area[0].input(rng.choice(QUERY_MIX))
+        _timed(timings, 'query', lambda: _button(at, 'Run Query').click().run())
+        errors.extend(e.value for e in at.error)
+        errors.extend(str(e.value) for e in at.exception)
+
+    rss_session = rss_bytes() - rss_start
+    _timed(timings, 'logout', lambda: _button(at, 'Logout').click().run())
+    return timings, errors, rss_session
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for interview_app.py')
+    parser.add_argument('--sessions', type=int, default=10, help='concurrent simulated users')
+    parser.add_argument('--rounds', type=int, default=5, help='queries per session')
+    parser.add_argument('--username', default='test1')
+    parser.add_argument('--password', default='EVS2024sql')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds per script run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+    if args.username == 'admin':
+        parser.error('admin changes are committed and pushed to the real repository; use a candidate user')
+
+    with tempfile.TemporaryDirectory(prefix='interview_load_') as workdir, Manager() as manager, \
+            ProcessPoolExecutor(max_workers=args.sessions) as pool:
+        for name in DATA_FILES:
+            shutil.copy(os.path.join(APP_DIR, name), workdir)
+        barrier = manager.Barrier(args.sessions + 1)
+        futures = [
+            pool.submit(run_session, args.username, args.password, args.rounds,
+                        args.seed + i, args.timeout, workdir, barrier)
+            for i in range(args.sessions)
+        ]
+        try:
+            barrier.wait(args.timeout + START_GRACE)
+        except BrokenBarrierError:
+            barrier.abort()
+            failures = [f.exception() for f in futures]
+            cause = next((e for e in failures if e and not isinstance(e, BrokenBarrierError)), None)
+            raise SystemExit(f'Sessions failed to start: {cause or "warm-up timed out"}')
+        start = time.perf_counter()
+        outcomes = [future.result() for future in futures]
+        wall = time.perf_counter() - start
+
+    timings = {}
+    errors = []
+    memory = []
+    for session_timings, session_errors, session_rss in outcomes:
+        for step, values in session_timings.items():
+            timings.setdefault(step, []).extend(values)
+        errors.extend(session_errors)
+        memory.append(session_rss)
+    operations = sum(len(values) for values in timings.values())
+
+    report = {
+        'sessions': args.sessions,
+        'rounds': args.rounds,
+        'wall_seconds': round(wall, 3),
+        'throughput_ops_per_second': round(operations / wall, 2),
+        'memory_per_session_mb': round(statistics.mean(memory) / 2 ** 20, 2),
+        'errors': len(errors),
+        'steps': {
+            step: {
+                'count': len(values),
+                'mean_ms': round(statistics.mean(values) * 1000, 1),
+                'p50_ms': round(percentile(values, 50) * 1000, 1),
+                'p95_ms': round(percentile(values, 95) * 1000, 1),
+                'p99_ms': round(percentile(values, 99) * 1000, 1),
+            }
+            for step, values in timings.items()
+        },
+    }
+
+    print(f"{args.sessions} sessions x {args.rounds} queries in {report['wall_seconds']}s, "
+          f"{report['throughput_ops_per_second']} ops/s, "
+          f"~{report['memory_per_session_mb']} MB per session, {len(errors)} errors")
+    print(f"{'step':<8}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+    for step, stats in report['steps'].items():
+        print(f"{step:<8}{stats['count']:>7}{stats['mean_ms']:>10}{stats['p50_ms']:>10}"
+              f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    for error in sorted(set(errors))[:5]:
+        print(f'error: {error}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
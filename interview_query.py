@@ -0,0 +1,235 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+# columns: column names ([] for statements that return no rows)
+# rows: fetched rows, at most max_rows of them
+# truncated: True if the query had more rows than max_rows
+# rowcount: rows changed by UPDATE / INSERT / DELETE (-1 for SELECT)
+# elapsed: wall-clock seconds to run the statement and fetch its rows
+# vm_steps: SQLite VM instructions executed (counted in PROGRESS_STEPS increments)
+# plan: EXPLAIN QUERY PLAN rows as (id, parent, detail)
+# cached: True if the result came from the shared cache instead of SQLite
+QueryResult = namedtuple(
+    'QueryResult',
+    ['columns', 'rows', 'truncated', 'rowcount', 'elapsed', 'vm_steps', 'plan', 'cached'],
+    defaults=[0.0, 0, (), False],
+)
+
+MAX_ROWS = 10_000
+# Cells (rows x columns) the shared result cache may hold in total, roughly
+# 50-100 MB of Python objects; a result bigger than this is never cached
+MAX_CACHE_CELLS = 1_000_000
+TIMEOUT_SECONDS = 5.0
+FETCH_CHUNK = 500
+
+# How many SQLite VM instructions run between two progress handler calls,
+# i.e. the granularity of both the timeout check and the step count
+PROGRESS_STEPS = 1_000
+
+QUERY_LOG_PATH = 'query_log.jsonl'
+
+READ_ONLY_PREFIXES = ('select', 'explain', 'values', 'pragma table_info')
+
+# Tokens of a WITH clause that matter for finding the statement after it:
+# string literals and comments are skipped whole, so their brackets don't count
+_CTE_TOKENS = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|--[^\n]*|/\*.*?\*/|[()]|,|\w+""", re.DOTALL)
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+# Collapse whitespace and drop trailing semicolons, leaving string literals
+# and quoted identifiers untouched, so trivially different spellings of the
+# same query share a cache entry
+def normalize_sql(query):
+    parts = re.split(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""", query.strip())
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r'\s+', ' ', parts[i])
+    return ''.join(parts).rstrip('; ')
+
+
+# Make duplicate column names (e.g. from SELECT * over a join) unique for display
+def unique_columns(columns):
+    seen = {}
+    unique = []
+    for name in columns:
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}_{seen[name]}'
+        else:
+            seen[name] = 0
+        unique.append(name)
+    return unique
+
+
+# First keyword of the statement that follows a leading WITH clause, e.g.
+# 'delete' for WITH x AS (...) DELETE FROM ...; every common table
+# expression ends with a bracket at depth 0 followed by a comma or that
+# keyword (a bracket followed by AS closes a column list instead)
+def statement_after_with(query):
+    depth = 0
+    closed = False
+    for token in _CTE_TOKENS.findall(query):
+        if token.startswith(('--', '/*')):
+            continue
+        if closed and depth == 0 and token.lower() not in (',', 'as'):
+            return token.lower()
+        closed = False
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+            closed = depth == 0
+    return ''
+
+
+def is_read_only(query):
+    sql = normalize_sql(query).lower()
+    if re.match(r'with\b', sql):
+        return statement_after_with(sql) in ('select', 'values')
+    return sql.startswith(READ_ONLY_PREFIXES)
+
+
+# EXPLAIN QUERY PLAN for a statement, without running it
+def query_plan(conn, query):
+    try:
+        return tuple((row[0], row[1], row[3]) for row in conn.execute(f'EXPLAIN QUERY PLAN {query}'))
+    except sqlite3.Error:
+        return ()
+
+
+# Render plan rows as an indented tree, like the sqlite3 shell does
+def format_plan(plan):
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, detail in plan:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return '\n'.join(lines)
+
+
+# Run one statement, fetching rows from the cursor in chunks and stopping at
+# max_rows. SQLite calls the progress handler while the statement runs; it
+# counts VM steps and aborts the statement once the timeout has passed.
+def execute(conn, query, max_rows=MAX_ROWS, timeout=TIMEOUT_SECONDS, chunk_size=FETCH_CHUNK):
+    plan = query_plan(conn, query)
+    calls = 0
+    deadline = time.monotonic() + timeout
+
+    def on_progress():
+        nonlocal calls
+        calls += 1
+        return time.monotonic() > deadline
+
+    conn.set_progress_handler(on_progress, PROGRESS_STEPS)
+    cursor = conn.cursor()
+    start = time.perf_counter()
+    try:
+        cursor.execute(query)
+        if cursor.description is None:
+            columns, rows, truncated = [], [], False
+        else:
+            columns = [d[0] for d in cursor.description]
+            rows = []
+            while len(rows) < max_rows:
+                chunk = cursor.fetchmany(min(chunk_size, max_rows - len(rows)))
+                if not chunk:
+                    break
+                rows.extend(chunk)
+            truncated = len(rows) == max_rows and cursor.fetchone() is not None
+        elapsed = time.perf_counter() - start
+        return QueryResult(columns, rows, truncated, cursor.rowcount, elapsed, calls * PROGRESS_STEPS, plan)
+    except sqlite3.OperationalError as e:
+        if str(e) == 'interrupted':
+            raise QueryTimeout(f'Query stopped after {timeout:g} seconds') from e
+        raise
+    finally:
+        cursor.close()
+        conn.set_progress_handler(None, 0)
+
+
+# Read-only query results shared by all sessions, keyed by dataset version,
+# normalized SQL and row cap. Bounded both by entry count and by total cells,
+# so a few wide results cannot pin a large share of process memory.
+class ResultCache:
+    def __init__(self, maxsize=256, max_cells=MAX_CACHE_CELLS):
+        self.maxsize = maxsize
+        self.max_cells = max_cells
+        self.cells = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        cells = len(value.rows) * max(len(value.columns), 1)
+        if cells > self.max_cells:
+            return
+        with self._lock:
+            if key in self._data:
+                self.cells -= self._data.pop(key)[1]
+            self._data[key] = (value, cells)
+            self.cells += cells
+            while len(self._data) > self.maxsize or self.cells > self.max_cells:
+                self.cells -= self._data.popitem(last=False)[1][1]
+
+
+result_cache = ResultCache()
+
+
+# Execute a query, answering read-only queries from the shared cache when the
+# same SQL already ran against the same dataset version. Pass version=None to
+# bypass the cache (e.g. on a connection with uncommitted changes).
+def run_query(conn, query, version=None, max_rows=MAX_ROWS, timeout=TIMEOUT_SECONDS):
+    cacheable = version is not None and is_read_only(query)
+    if cacheable:
+        key = (version, normalize_sql(query), max_rows)
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached._replace(cached=True)
+    result = execute(conn, query, max_rows=max_rows, timeout=timeout)
+    if cacheable:
+        result_cache.put(key, result)
+    return result
+
+
+_log_lock = threading.Lock()
+
+
+# Append one profiling record per executed query, tagged with user and session
+def log_query(user, session_id, query, result=None, error=None, path=QUERY_LOG_PATH):
+    record = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'user': user,
+        'session': session_id,
+        'query': normalize_sql(query),
+    }
+    if result is not None:
+        record.update(
+            elapsed=round(result.elapsed, 6),
+            rows=len(result.rows),
+            truncated=result.truncated,
+            rowcount=result.rowcount,
+            vm_steps=result.vm_steps,
+            plan=[detail for _, _, detail in result.plan],
+            cached=result.cached,
+        )
+    if error is not None:
+        record['error'] = str(error)
+    with _log_lock, open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
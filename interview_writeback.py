@@ -0,0 +1,140 @@
+import os
+import re
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+import interview_db
+
+# Seconds to wait after the last modification before writing and committing,
+# so a burst of admin changes ends up in a single commit
+DEBOUNCE_SECONDS = 5.0
+
+# Seconds to wait before retrying a batch whose export, commit or push failed
+RETRY_SECONDS = 30.0
+
+_MODIFY_PATTERN = re.compile(
+    r'^\s*(?:update(?:\s+or\s+\w+)?|(?:insert|replace)(?:\s+or\s+\w+)?\s+into|delete\s+from)\s+["`\[]?(\w+)',
+    re.IGNORECASE,
+)
+
+
+# Table an UPDATE / INSERT / REPLACE / DELETE statement modifies, as a list;
+# empty for anything else (queries, DDL, statements on other tables), which
+# the write-back can't export
+def modified_tables(query, tables):
+    match = _MODIFY_PATTERN.match(query)
+    if match:
+        for name in tables:
+            if name.lower() == match.group(1).lower():
+                return [name]
+    return []
+
+
+# Background thread that exports modified tables from the database to their
+# CSV files and commits (and optionally pushes) them with git. Modifications
+# submitted within the debounce window are coalesced into one commit that
+# only contains the CSVs of tables that actually changed. A failed batch goes
+# back to the pending set and is retried after RETRY_SECONDS, together with
+# whatever was submitted in the meantime.
+class WriteBackWorker:
+    def __init__(self, db_path, tables, repo_dir='.', debounce=DEBOUNCE_SECONDS, push=True, retry=RETRY_SECONDS):
+        self.db_path = db_path
+        self.tables = {name: os.path.abspath(path) for name, path in tables.items()}  # table name -> CSV path
+        self.repo_dir = repo_dir
+        self.debounce = debounce
+        self.push = push
+        self._pending = set()
+        self._busy = False
+        self.retry = retry
+        self._last_submit = 0.0
+        self._retry_at = 0.0
+        self._unpushed = False  # a commit whose push failed, pushed on the next batch
+        self._cond = threading.Condition()
+        self._status = {'state': 'idle', 'pending': [], 'last_commit': None, 'last_error': None, 'updated': None}
+        self._thread = threading.Thread(target=self._run, name='csv-writeback', daemon=True)
+        self._thread.start()
+
+    def submit(self, table_names):
+        with self._cond:
+            self._pending.update(table_names)
+            self._last_submit = time.monotonic()
+            self._set_status(state='pending', pending=sorted(self._pending))
+            self._cond.notify_all()
+
+    def status(self):
+        with self._cond:
+            return dict(self._status)
+
+    # Block until everything submitted so far is written and committed
+    def flush(self, timeout=None):
+        with self._cond:
+            self._last_submit = 0.0
+            self._retry_at = 0.0
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def _set_status(self, **changes):
+        self._status.update(changes, updated=datetime.now().isoformat(timespec='seconds'))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                while (remaining := max(self._last_submit + self.debounce, self._retry_at) - time.monotonic()) > 0:
+                    self._cond.wait(remaining)
+                batch = sorted(self._pending)
+                self._pending.clear()
+                self._busy = True
+                self._set_status(state='writing', pending=batch)
+            try:
+                commit = self._write(batch) or self._status['last_commit']
+                with self._cond:
+                    self._set_status(state='idle', pending=sorted(self._pending), last_commit=commit, last_error=None)
+            except Exception as e:
+                with self._cond:
+                    self._pending.update(batch)
+                    self._retry_at = time.monotonic() + self.retry
+                    self._set_status(state='error', pending=sorted(self._pending), last_error=str(e))
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _git(self, *args):
+        return subprocess.run(
+            ['git', '-C', self.repo_dir, *args], check=True, capture_output=True, text=True
+        ).stdout.strip()
+
+    def _write(self, table_names):
+        # The database stays the source of truth: exporting also marks it as
+        # up to date with the new CSVs, so other sessions don't rebuild it
+        interview_db.export_tables(table_names, self.db_path, csv_paths=self.tables)
+        paths = [self.tables[name] for name in table_names]
+
+        self._git('add', '--', *paths)
+        staged = subprocess.run(['git', '-C', self.repo_dir, 'diff', '--cached', '--quiet', '--', *paths])
+        if staged.returncode == 0 and not self._unpushed:
+            return None  # the CSVs already matched the database
+        if staged.returncode != 0:
+            names = ', '.join(os.path.basename(path) for path in paths)
+            self._git('commit', '-m', f'Update {names}', '--', *paths)
+            self._unpushed = self.push
+        if self._unpushed:
+            self._git('push')
+            self._unpushed = False
+        return self._git('rev-parse', '--short', 'HEAD')
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+# One worker per process, shared by every session
+def get_worker(db_path, tables, **kwargs):
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = WriteBackWorker(db_path, tables, **kwargs)
+        return _worker
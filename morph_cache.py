@@ -0,0 +1,224 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from morph_pipeline import detect_face_landmarks
+from shared_cache import LRUCache
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "morphing_cache")
+MAX_CACHE_BYTES = 2 * 1024 ** 3  # videos en disco antes de empezar a borrar
+MAX_IMAGES = 8  # imágenes decodificadas / redimensionadas en memoria
+# Renders completos en paralelo: cada uno ya reparte el blend entre hilos, pero
+# con más de uno un video largo no deja en cola a todas las demás sesiones
+RENDER_WORKERS = 3
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Clave de un video: mismo contenido de imágenes y mismos parámetros -> mismo
+# archivo. `extra` distingue el modo (crossfade / morph con sus puntos).
+def render_key(digest1, digest2, size, frame_count, fps, codec, extra=()):
+    raw = repr((digest1, digest2, tuple(size), frame_count, fps, codec, extra))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# Imágenes subidas, decodificadas y redimensionadas, y los puntos de la cara
+# detectados en ellas, guardados por hash de contenido para que los reruns de
+# Streamlit no repitan el decode, el LANCZOS ni mediapipe
+class ImageCache:
+    # El LRU compartido decodifica o redimensiona fuera de su lock general,
+    # con un lock por clave: una imagen grande no bloquea los aciertos de las
+    # demás sesiones y dos sesiones no repiten el mismo trabajo
+    def __init__(self, maxsize=MAX_IMAGES):
+        self._cache = LRUCache(maxsize)
+
+    def decoded(self, digest, data):
+        return self._cache.get_or_compute(
+            (digest, None), lambda: Image.open(io.BytesIO(data)).convert("RGB"),
+        )
+
+    def resized(self, digest, data, size):
+        size = tuple(size)
+        original = self.decoded(digest, data)
+        if original.size == size:
+            return original
+        return self._cache.get_or_compute(
+            (digest, size), lambda: original.resize(size, Image.LANCZOS),
+        )
+
+    # Puntos de la cara en pixeles de la imagen subida, None si no hay cara.
+    # Sin mediapipe lanza ImportError y no se guarda nada.
+    def face_landmarks(self, digest, data):
+        original = self.decoded(digest, data)
+        return self._cache.get_or_compute(
+            (digest, "landmarks"), lambda: detect_face_landmarks(original),
+        )
+
+
+# Videos ya renderizados en CACHE_DIR, nombrados por su clave. Un acierto
+# actualiza la fecha del archivo; al pasar de max_bytes se borran los menos
+# usados recientemente.
+class RenderCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.mp4")
+
+    def get(self, key):
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    # Devuelve el video de `key`, llamando a render(ruta) para crearlo si no
+    # está. Dos sesiones pidiendo la misma clave no la renderizan dos veces.
+    def get_or_render(self, key, render):
+        paths, missing = self.get_or_render_many([key], lambda partials: render(partials[key]))
+        return paths[key], not missing
+
+    # Igual que get_or_render para varias claves que salen de un mismo render
+    # (por ejemplo varias resoluciones): render({clave: ruta}) recibe solo las
+    # que faltan. Devuelve ({clave: ruta}, claves renderizadas).
+    def get_or_render_many(self, keys, render):
+        with self._lock:
+            locks = [self._key_locks.setdefault(key, threading.Lock()) for key in sorted(set(keys))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            paths = {key: self.get(key) for key in keys}
+            missing = [key for key in keys if paths[key] is None]
+            if missing:
+                partials = [os.path.join(self.directory, f"{key}.part.mp4") for key in missing]
+                try:
+                    render(dict(zip(missing, partials)))
+                    for key, partial in zip(missing, partials):
+                        paths[key] = self.path_for(key)
+                        os.replace(partial, paths[key])
+                finally:
+                    for partial in partials:
+                        if os.path.exists(partial):
+                            os.remove(partial)
+        finally:
+            for lock in locks:
+                lock.release()
+        with self._lock:
+            for key in keys:
+                self._key_locks.pop(key, None)
+        if missing:
+            self.evict(keep=set(paths.values()))
+        return paths, missing
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".mp4") or name.endswith(".part.mp4"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    # Borra los videos más antiguos hasta quedar bajo max_bytes (nunca los de `keep`)
+    def evict(self, keep=()):
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path in keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self):
+        with self._lock:
+            entries = self._entries()
+        return {"videos": len(entries), "bytes": sum(size for _, size, _ in entries), "max_bytes": self.max_bytes}
+
+
+# Render en segundo plano: el progreso se guarda aquí y la página lo consulta
+# en cada rerun (los hilos no pueden escribir en la página)
+class RenderJob:
+    def __init__(self, keys, total):
+        self.keys = keys
+        self.done = 0
+        self.total = total
+        self.future = None
+
+    def update(self, done, total):
+        self.done, self.total = done, total
+
+    # "queued" mientras espera un worker libre, luego "running", "done" o "error"
+    def state(self):
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        return "error" if self.future.exception() else "done"
+
+
+class RenderJobs:
+    def __init__(self, cache, workers=RENDER_WORKERS, keep=32):
+        self.cache = cache
+        self.keep = keep
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Encola render({clave: ruta}, progress) para las claves `keys`, salvo que
+    # ya haya un trabajo en curso para ellas o uno terminado cuyos videos sigan
+    # en la caché
+    def submit(self, keys, total, render):
+        job_key = tuple(keys)
+        with self._lock:
+            job = self._jobs.get(job_key)
+            if job is not None:
+                state = job.state()
+                if state in ("queued", "running") or (state == "done" and all(self.cache.get(k) for k in keys)):
+                    return job
+            job = RenderJob(job_key, total)
+            job.future = self._pool.submit(
+                self.cache.get_or_render_many, list(keys), lambda partials: render(partials, job.update),
+            )
+            self._jobs[job_key] = job
+            self._jobs.move_to_end(job_key)
+            while len(self._jobs) > self.keep:
+                self._jobs.popitem(last=False)
+            return job
+
+    def get(self, keys):
+        with self._lock:
+            return self._jobs.get(tuple(keys))
+
+    # Trabajos sin terminar encolados antes que `job` (0 si ya está corriendo)
+    def ahead(self, job):
+        with self._lock:
+            waiting = [j for j in self._jobs.values() if not j.future.done()]
+        if job not in waiting or job.state() == "running":
+            return 0
+        return waiting.index(job)
+
+
+images = ImageCache()
+renders = RenderCache()
+jobs = RenderJobs(renders)
@@ -0,0 +1,442 @@
+import itertools
+import os
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import imageio.v2 as imageio
+import imageio_ffmpeg
+from PIL import Image, ImageDraw
+
+# El blend trabaja en punto fijo: alpha se cuantiza a 1/256 y cada pixel es
+# (a * (256 - w) + b * w + 128) >> 8, que cabe en uint16 sin desbordar
+BLEND_SHIFT = 8
+BLEND_ONE = 1 << BLEND_SHIFT
+
+# Filas por bloque: las temporales uint16 son de este tamaño y no del
+# fotograma entero, así se quedan en caché
+BAND_ROWS = 64
+
+# Vista previa: lado mayor en pixeles y máximo de fotogramas
+PREVIEW_SIDE = 320
+PREVIEW_FRAMES = 24
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+# Peso entero (0..256) de img2 en el fotograma i
+def blend_weight(i, frame_count):
+    if frame_count <= 1:
+        return BLEND_ONE
+    return (i * BLEND_ONE + (frame_count - 1) // 2) // (frame_count - 1)
+
+
+# Mezcla a y b con peso w en `out`, por bandas de filas. scratch: dos arrays
+# uint16 de BAND_ROWS filas, reutilizados entre fotogramas.
+def blend_into(out, a, b, w, scratch):
+    if w == 0:
+        np.copyto(out, a)
+        return out
+    if w == BLEND_ONE:
+        np.copyto(out, b)
+        return out
+    inv = np.uint16(BLEND_ONE - w)
+    w = np.uint16(w)
+    for top in range(0, out.shape[0], BAND_ROWS):
+        rows = slice(top, top + BAND_ROWS)
+        n = min(BAND_ROWS, out.shape[0] - top)
+        acc, tmp = scratch[0][:n], scratch[1][:n]
+        np.multiply(a[rows], inv, out=acc)
+        np.multiply(b[rows], w, out=tmp)
+        acc += tmp
+        acc += BLEND_ONE // 2
+        acc >>= BLEND_SHIFT
+        np.copyto(out[rows], acc, casting="unsafe")
+    return out
+
+
+# Genera frame_count fotogramas con render(i, out, scratch). Un pool de hilos
+# calcula hasta `ahead` fotogramas por adelantado (numpy suelta el GIL)
+# mientras el consumidor codifica el actual; cada fotograma va a un buffer
+# preasignado que se reutiliza, así que la memoria es fija sea cual sea
+# frame_count. El array entregado solo es válido hasta pedir el siguiente: el
+# writer de imageio lo copia al pipe de ffmpeg, quien lo guarde debe hacer .copy().
+def _render_ahead(render, shape, frame_count, workers=None, ahead=None):
+    workers = workers or default_workers()
+    ahead = max(1, ahead or 2 * workers)
+
+    # Un buffer por fotograma en vuelo más el que tiene el consumidor
+    slots = [
+        (np.empty(shape, np.uint8), [np.empty((BAND_ROWS,) + shape[1:], np.uint16) for _ in range(2)])
+        for _ in range(min(ahead, frame_count) + 1)
+    ]
+
+    def run(i):
+        out, scratch = slots[i % len(slots)]
+        return render(i, out, scratch)
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        submitted = 0
+        for i in range(frame_count):
+            while submitted < min(frame_count, i + ahead):
+                pending.append(pool.submit(run, submitted))
+                submitted += 1
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+def _as_pair(img1, img2):
+    a = np.ascontiguousarray(np.asarray(img1, dtype=np.uint8))
+    b = np.ascontiguousarray(np.asarray(img2, dtype=np.uint8))
+    if a.shape != b.shape:
+        raise ValueError(f"Las imágenes deben tener el mismo tamaño: {a.shape} vs {b.shape}")
+    return a, b
+
+
+# Fotogramas del crossfade de img1 a img2 (ver _render_ahead)
+def crossfade_frames(img1, img2, frame_count, workers=None, ahead=None):
+    a, b = _as_pair(img1, img2)
+
+    def render(i, out, scratch):
+        return blend_into(out, a, b, blend_weight(i, frame_count), scratch)
+
+    return _render_ahead(render, a.shape, frame_count, workers, ahead)
+
+
+# --- Morph con puntos de referencia ---
+
+# "x,y" por línea (también vale separar con ; o espacios) -> [(x, y), ...]
+def parse_points(text):
+    points = []
+    for token in text.replace(";", "\n").split("\n"):
+        token = token.strip()
+        if not token:
+            continue
+        parts = token.replace(",", " ").split()
+        if len(parts) != 2:
+            raise ValueError(f"Punto inválido: {token!r} (se espera x,y)")
+        points.append((float(parts[0]), float(parts[1])))
+    return points
+
+
+# Reescala puntos dados sobre una imagen de tamaño `from_size` a `to_size`
+def scale_points(points, from_size, to_size):
+    sx = to_size[0] / from_size[0]
+    sy = to_size[1] / from_size[1]
+    return [(x * sx, y * sy) for x, y in points]
+
+
+# Puntos de la cara con mediapipe (opcional). Devuelve None si no hay cara.
+def detect_face_landmarks(img):
+    import mediapipe as mp
+    arr = np.asarray(img.convert("RGB") if isinstance(img, Image.Image) else img, dtype=np.uint8)
+    with mp.solutions.face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1) as mesh:
+        result = mesh.process(arr)
+    if not result.multi_face_landmarks:
+        return None
+    h, w = arr.shape[:2]
+    return [(p.x * w, p.y * h) for p in result.multi_face_landmarks[0].landmark]
+
+
+# Puntos correspondientes de img1 e img2 reescalados a `size`: detectados en
+# la cara si auto, si no leídos de text1 / text2 (en pixeles de las imágenes
+# originales). `detect_faces` devuelve las dos detecciones, p. ej. desde una
+# caché; por defecto se corre mediapipe en ambas imágenes. Lanza ValueError si
+# no se pueden emparejar.
+def landmark_pairs(img1, img2, size, text1="", text2="", auto=False, detect_faces=None):
+    if auto:
+        try:
+            if detect_faces is not None:
+                p1, p2 = detect_faces()
+            else:
+                p1, p2 = detect_face_landmarks(img1), detect_face_landmarks(img2)
+        except ImportError:
+            raise ValueError("La detección automática requiere mediapipe (pip install mediapipe).")
+        if p1 is None or p2 is None:
+            raise ValueError("No se detectó una cara en ambas imágenes.")
+    else:
+        p1, p2 = parse_points(text1), parse_points(text2)
+    if len(p1) != len(p2):
+        raise ValueError(f"Se necesitan los mismos puntos en ambas imágenes ({len(p1)} vs {len(p2)}).")
+    return scale_points(p1, img1.size, size), scale_points(p2, img2.size, size)
+
+
+# Esquinas y puntos medios del borde, para que la triangulación cubra la imagen
+def border_points(size):
+    w, h = size[0] - 1, size[1] - 1
+    return [(0, 0), (w / 2, 0), (w, 0), (w, h / 2), (w, h), (w / 2, h), (0, h), (0, h / 2)]
+
+
+# Triangulación de Delaunay (Bowyer-Watson) -> array (n, 3) de índices
+def delaunay(points):
+    pts = np.asarray(points, dtype=np.float64)
+    n = len(pts)
+    center = (pts.min(axis=0) + pts.max(axis=0)) / 2
+    span = max(np.ptp(pts, axis=0).max(), 1.0) * 100
+    everything = np.vstack([pts, center + span * np.array([[-1.0, -1.0], [1.0, -1.0], [0.0, 1.0]])])
+
+    def circles(tris):
+        a, b, c = (everything[tris[:, k]] for k in range(3))
+        d = 2 * (a[:, 0] * (b[:, 1] - c[:, 1]) + b[:, 0] * (c[:, 1] - a[:, 1]) + c[:, 0] * (a[:, 1] - b[:, 1]))
+        d = np.where(d == 0, 1e-12, d)
+        sa, sb, sc = (a ** 2).sum(1), (b ** 2).sum(1), (c ** 2).sum(1)
+        ux = (sa * (b[:, 1] - c[:, 1]) + sb * (c[:, 1] - a[:, 1]) + sc * (a[:, 1] - b[:, 1])) / d
+        uy = (sa * (c[:, 0] - b[:, 0]) + sb * (a[:, 0] - c[:, 0]) + sc * (b[:, 0] - a[:, 0])) / d
+        centers = np.column_stack([ux, uy])
+        return centers, ((a - centers) ** 2).sum(1)
+
+    tris = np.array([[n, n + 1, n + 2]])
+    centers, radii = circles(tris)
+    for i in range(n):
+        bad = ((centers - everything[i]) ** 2).sum(1) < radii * (1 - 1e-12)
+        edges = {}
+        for t in tris[bad]:
+            for e in ((t[0], t[1]), (t[1], t[2]), (t[2], t[0])):
+                key = tuple(sorted(e))
+                edges[key] = edges.get(key, 0) + 1
+        new = np.array([[e[0], e[1], i] for e, count in edges.items() if count == 1], dtype=tris.dtype)
+        new_centers, new_radii = circles(new)
+        keep = ~bad
+        tris = np.vstack([tris[keep], new])
+        centers = np.vstack([centers[keep], new_centers])
+        radii = np.concatenate([radii[keep], new_radii])
+    return tris[(tris < n).all(axis=1)]
+
+
+# Geometría del morph: triangulación (sobre la forma media) y vértices de cada
+# triángulo en las dos imágenes. Las transformaciones afines por fotograma se
+# calculan una vez por peso (0..256) y quedan guardadas, así que cambiar
+# frame_count o FPS no recalcula nada ya visto.
+class MorphGeometry:
+    def __init__(self, points1, points2, size):
+        border = border_points(size)
+        p1 = np.array(list(points1) + border, dtype=np.float64)
+        p2 = np.array(list(points2) + border, dtype=np.float64)
+        self.size = size
+        self.triangles = delaunay((p1 + p2) / 2)
+        self.vertices1 = p1[self.triangles]  # (n, 3, 2)
+        self.vertices2 = p2[self.triangles]
+        self._transforms = {}
+
+    # Vértices intermedios y afines (n + 1, 2, 3) que llevan cada pixel del
+    # fotograma con peso w a su posición en img1 y en img2. La última afín es
+    # la identidad, para pixeles que no caigan en ningún triángulo.
+    def transforms(self, w):
+        cached = self._transforms.get(w)
+        if cached is None:
+            t = w / BLEND_ONE
+            mid = (1 - t) * self.vertices1 + t * self.vertices2
+            ones = np.ones(mid.shape[:2] + (1,))
+            inv_mid = np.linalg.pinv(np.concatenate([mid, ones], axis=2).transpose(0, 2, 1))
+            identity = np.array([[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]])
+            to1 = np.concatenate([self.vertices1.transpose(0, 2, 1) @ inv_mid, identity])
+            to2 = np.concatenate([self.vertices2.transpose(0, 2, 1) @ inv_mid, identity])
+            cached = self._transforms.setdefault(w, (mid, to1, to2))
+        return cached
+
+
+@lru_cache(maxsize=32)
+def morph_geometry(points1, points2, size):
+    if len(points1) != len(points2):
+        raise ValueError(f"Se necesitan los mismos puntos en ambas imágenes ({len(points1)} vs {len(points2)})")
+    return MorphGeometry(points1, points2, size)
+
+
+# Índice de triángulo de cada pixel de las filas [top, top + rows), dibujando
+# con Pillow solo los triángulos que tocan la banda. -1 -> ninguno.
+def _triangle_map(mid, width, top, rows):
+    ys = mid[:, :, 1]
+    hits = np.nonzero((ys.max(axis=1) >= top) & (ys.min(axis=1) <= top + rows - 1))[0]
+    canvas = Image.new("I", (width, rows), 0)
+    draw = ImageDraw.Draw(canvas)
+    for k in hits:
+        draw.polygon([(x, y - top) for x, y in mid[k]], fill=int(k) + 1)
+    return np.asarray(canvas, dtype=np.int64) - 1
+
+
+# Muestreo bilineal de img en las coordenadas (sx, sy). flat: img como
+# (alto * ancho, canales), np.take sobre índices planos es mucho más rápido
+# que indexar con dos arrays.
+def _sample(flat, shape, sx, sy):
+    h, w = shape[:2]
+    sx = np.clip(sx, 0, w - 1)
+    sy = np.clip(sy, 0, h - 1)
+    x0 = sx.astype(np.intp)
+    y0 = sy.astype(np.intp)
+    fx = (sx - x0).astype(np.float32)[..., None]
+    fy = (sy - y0).astype(np.float32)[..., None]
+    i00 = y0 * w + x0
+    dx = (x0 < w - 1).astype(np.intp)
+    dy = (y0 < h - 1) * w
+    top = np.take(flat, i00, axis=0).astype(np.float32)
+    top += (np.take(flat, i00 + dx, axis=0) - top) * fx
+    bottom = np.take(flat, i00 + dy, axis=0).astype(np.float32)
+    bottom += (np.take(flat, i00 + dy + dx, axis=0) - bottom) * fx
+    top += (bottom - top) * fy
+    top += 0.5
+    return top.astype(np.uint8)
+
+
+# Deforma img1 e img2 hacia la forma intermedia de peso w y las mezcla en out,
+# por bandas de filas (mapeo inverso: cada pixel de salida busca su origen)
+def morph_into(out, a, b, geometry, w, scratch):
+    mid, to1, to2 = geometry.transforms(w)
+    h, width = out.shape[:2]
+    xs = np.arange(width, dtype=np.float32)
+    coeffs = [affine.reshape(len(affine), 6).T.astype(np.float32) for affine in (to1, to2)]
+    flats = (a.reshape(h * width, -1), b.reshape(h * width, -1))
+    for top in range(0, h, BAND_ROWS):
+        rows = min(BAND_ROWS, h - top)
+        ids = _triangle_map(mid, width, top, rows)
+        ys = np.arange(top, top + rows, dtype=np.float32)[:, None]
+        warped = []
+        for flat, c in zip(flats, coeffs):
+            m = [np.take(row, ids) for row in c]
+            sx = m[0] * xs + m[1] * ys + m[2]
+            sy = m[3] * xs + m[4] * ys + m[5]
+            warped.append(_sample(flat, a.shape, sx, sy).reshape((rows,) + a.shape[1:]))
+        blend_into(out[top:top + rows], warped[0], warped[1], w, scratch)
+    return out
+
+
+# Fotogramas del morph de img1 a img2: points1[k] en img1 corresponde a
+# points2[k] en img2, en pixeles de las imágenes ya redimensionadas
+def morph_frames(img1, img2, points1, points2, frame_count, workers=None, ahead=None):
+    a, b = _as_pair(img1, img2)
+    size = (a.shape[1], a.shape[0])
+    geometry = morph_geometry(
+        tuple(map(tuple, points1)), tuple(map(tuple, points2)), size,
+    )
+
+    def render(i, out, scratch):
+        return morph_into(out, a, b, geometry, blend_weight(i, frame_count), scratch)
+
+    return _render_ahead(render, a.shape, frame_count, workers, ahead)
+
+
+# Envía los fotogramas directo al writer de ffmpeg. progress(hechos, total) se
+# llama cada vez que el codificador recibe un fotograma.
+def write_video(frames, path, fps, frame_count, codec="libx264", progress=None):
+    with imageio.get_writer(path, fps=fps, codec=codec) as writer:
+        for i, frame in enumerate(frames):
+            writer.append_data(frame)
+            if progress:
+                progress(i + 1, frame_count)
+    return path
+
+
+# Varias resoluciones en una sola pasada de blend: outputs es [(ruta, (ancho,
+# alto)), ...]. Cada fotograma se calcula una vez al tamaño de `frames` y se
+# reduce con Pillow para cada salida de otro tamaño.
+def write_ladder(frames, outputs, fps, frame_count, codec="libx264", progress=None):
+    with ExitStack() as stack:
+        writers = [
+            (stack.enter_context(imageio.get_writer(path, fps=fps, codec=codec)), tuple(size))
+            for path, size in outputs
+        ]
+        for i, frame in enumerate(frames):
+            source = None
+            for writer, size in writers:
+                if size == (frame.shape[1], frame.shape[0]):
+                    writer.append_data(frame)
+                    continue
+                if source is None:
+                    source = Image.fromarray(frame)
+                writer.append_data(np.asarray(source.resize(size, Image.BILINEAR, reducing_gap=2.0)))
+            if progress:
+                progress(i + 1, frame_count)
+    return [path for path, _ in outputs]
+
+
+# Tamaño con el lado mayor en `side` pixeles (o el original si ya es menor),
+# redondeado a múltiplos de 16 como espera el encoder
+def fit_size(size, side):
+    scale = min(1.0, side / max(size))
+    return tuple(max(16, int(round(d * scale / 16)) * 16) for d in size)
+
+
+# Parámetros de la vista previa: pocos fotogramas a baja resolución con la
+# misma duración que el video final
+def preview_plan(size, frame_count, fps, side=PREVIEW_SIDE, max_frames=PREVIEW_FRAMES):
+    frames = min(frame_count, max_frames)
+    preview_fps = max(1, round(frames * fps / frame_count))
+    return fit_size(size, side), frames, preview_fps
+
+
+# Envía el audio a ffmpeg por un pipe extra, sin pasar por disco. Si ffmpeg ya
+# tiene todo lo que necesita (-t) cierra el pipe antes de tiempo: no es error.
+def _feed_audio(fd, data):
+    try:
+        with os.fdopen(fd, "wb") as pipe:
+            pipe.write(data)
+    except (BrokenPipeError, OSError):
+        pass
+
+
+# Video y audio en una sola pasada de ffmpeg: los fotogramas entran por stdin
+# como rgb24 y el audio (ruta, o bytes de un mp3/wav subido) se recorta a la
+# duración del video y se codifica en el mismo proceso. Sin el video
+# intermedio ni el segundo decode/encode de moviepy.
+def write_video_with_audio(frames, path, fps, frame_count, audio, codec="libx264",
+                           audio_codec="aac", progress=None):
+    frames = iter(frames)
+    first = next(frames)
+    h, w = first.shape[:2]
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{w}x{h}", "-r", str(fps), "-i", "pipe:0",
+    ]
+    pass_fds = ()
+    audio_fd = None
+    if isinstance(audio, (bytes, bytearray)):
+        read_fd, audio_fd = os.pipe()
+        pass_fds = (read_fd,)
+        cmd += ["-i", f"pipe:{read_fd}"]
+    else:
+        cmd += ["-i", audio]
+    cmd += [
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", codec, "-pix_fmt", "yuv420p", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+        "-c:a", audio_codec, "-t", f"{frame_count / fps:.3f}", "-movflags", "+faststart",
+        path,
+    ]
+
+    with tempfile.TemporaryFile() as log:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=log, pass_fds=pass_fds)
+        feeder = None
+        if audio_fd is not None:
+            os.close(pass_fds[0])
+            feeder = threading.Thread(target=_feed_audio, args=(audio_fd, audio), daemon=True)
+            feeder.start()
+        try:
+            for i, frame in enumerate(itertools.chain([first], frames), start=1):
+                proc.stdin.write(frame)
+                if progress:
+                    progress(i, frame_count)
+        except BrokenPipeError:
+            pass  # ffmpeg falló: el motivo queda en el log
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            returncode = proc.wait()
+            if feeder is not None:
+                feeder.join()
+        if returncode != 0:
+            log.seek(0)
+            message = log.read().decode(errors="replace").strip()
+            raise RuntimeError(f"ffmpeg terminó con código {returncode}: {message}")
+    return path
@@ -1,8 +1,13 @@
 import streamlit as st
-import numpy as np
-from PIL import Image
-import imageio.v2 as imageio
-import tempfile
+
+from morph_cache import content_hash, images, jobs, render_key, renders
+from morph_pipeline import (
+    crossfade_frames, fit_size, landmark_pairs, morph_frames, preview_plan, scale_points,
+    write_ladder, write_video,
+)
+
+CODEC = "libx264"
+LADDER_SIDES = [1920, 1280, 720, 480]
 
 st.set_page_config(page_title="Morphing simple (crossfade)", page_icon="🎬")
 
@@ -15,6 +20,18 @@ with col1:
 with col2:
     f2 = st.file_uploader("Imagen final", type=["jpg", "jpeg", "png"])
 
+with st.expander("Modo"):
+    modo = st.radio("Tipo de transición", ["Crossfade", "Morph con puntos de referencia"])
+    if modo != "Crossfade":
+        st.caption("Puntos correspondientes en ambas imágenes, en pixeles de la imagen subida: "
+                   "uno por línea como x,y (ojos, nariz, boca...). Los bordes se agregan solos.")
+        auto_points = st.checkbox("Detectar puntos de la cara (requiere mediapipe)", False)
+        pcol1, pcol2 = st.columns(2)
+        with pcol1:
+            points_text1 = st.text_area("Puntos imagen inicial", disabled=auto_points)
+        with pcol2:
+            points_text2 = st.text_area("Puntos imagen final", disabled=auto_points)
+
 with st.expander("Parámetros"):
     frame_count = st.slider("Número de fotogramas", 30, 600, 250, 10)
     fps = st.slider("FPS", 5, 60, 30, 1)
@@ -22,6 +39,11 @@ with st.expander("Parámetros"):
     if not auto_size:
         width = st.number_input("Ancho", 64, 4000, 768, 16)
         height = st.number_input("Alto", 64, 4000, 1024, 16)
+    ladder = st.multiselect(
+        "Resoluciones adicionales (lado mayor, px)", LADDER_SIDES,
+        help="Se generan junto con el video completo, en la misma pasada.",
+    )
+    live_preview = st.checkbox("Vista previa rápida al cambiar parámetros", True)
 
 # Cálculo de duración y despliegue
 duracion = frame_count / fps
@@ -29,39 +51,112 @@ st.markdown(f"**Duración estimada del video:** {duracion:.1f} segundos")
 
 generate = st.button("Generar video", disabled=not (f1 and f2))
 
-if generate:
-    if not (f1 and f2):
+if not (f1 and f2):
+    if generate:
         st.error("Sube ambas imágenes.")
+    st.stop()
+
+# Imágenes y videos se guardan por hash de contenido: repetir con los
+# mismos archivos y parámetros no vuelve a decodificar ni a renderizar
+data1, data2 = f1.getvalue(), f2.getvalue()
+digest1, digest2 = content_hash(data1), content_hash(data2)
+img1 = images.decoded(digest1, data1)
+img2 = images.decoded(digest2, data2)
+
+base_size = img1.size if auto_size else (int(width), int(height))
+extra = ("crossfade",)
+if modo != "Crossfade":
+    try:
+        points1, points2 = landmark_pairs(
+            img1, img2, base_size, points_text1, points_text2, auto_points,
+            detect_faces=lambda: (images.face_landmarks(digest1, data1), images.face_landmarks(digest2, data2)),
+        )
+    except ValueError as e:
+        st.error(str(e))
         st.stop()
+    extra = ("morph", tuple(points1), tuple(points2))
+
+
+# Fotogramas a tamaño `size`, con las imágenes redimensionadas desde la caché
+def make_frames(size, count):
+    a = images.resized(digest1, data1, size)
+    b = images.resized(digest2, data2, size)
+    if modo == "Crossfade":
+        return crossfade_frames(a, b, count)
+    # La triangulación y las afines quedan en caché: cambiar fotogramas o
+    # FPS con los mismos puntos no recalcula la geometría
+    return morph_frames(
+        a, b, scale_points(points1, base_size, size), scale_points(points2, base_size, size), count,
+    )
+
+
+# Vista previa: mismo pipeline a baja resolución y con pocos fotogramas, se
+# rehace en cada cambio de parámetros y tarda menos de un segundo
+if live_preview:
+    p_size, p_frames, p_fps = preview_plan(base_size, frame_count, fps)
+    p_key = render_key(digest1, digest2, p_size, p_frames, p_fps, CODEC, extra)
+    preview_path, _ = renders.get_or_render(
+        p_key, lambda path: write_video(make_frames(p_size, p_frames), path, p_fps, p_frames, CODEC),
+    )
+    st.caption(f"Vista previa: {p_size[0]}×{p_size[1]}, {p_frames} fotogramas a {p_fps} FPS")
+    st.video(preview_path)
+
+# Video completo (y resoluciones adicionales) en segundo plano: todas las
+# salidas comparten una sola pasada de blend a la resolución mayor
+if generate:
+    sizes = [tuple(base_size)]
+    for side in sorted(ladder, reverse=True):
+        size = fit_size(base_size, side)
+        if size not in sizes and max(size) < max(base_size):
+            sizes.append(size)
+    keys = [render_key(digest1, digest2, size, frame_count, fps, CODEC, extra) for size in sizes]
+
+    def render_all(partials, progress):
+        outputs = [(partials[key], size) for key, size in zip(keys, sizes) if key in partials]
+        blend_size = max((size for _, size in outputs), key=lambda size: size[0] * size[1])
+        write_ladder(make_frames(blend_size, frame_count), outputs, fps, frame_count, CODEC, progress)
+
+    jobs.submit(keys, frame_count, render_all)
+    st.session_state["morph_shown"] = None
+    st.session_state["morph_job"] = {
+        "keys": keys,
+        "sizes": sizes,
+        "label": f"{frame_count} fotogramas a {fps} FPS",
+    }
+
+
+@st.fragment(run_every=2)
+def show_render_status(keys):
+    job = jobs.get(keys)
+    if job is None:
+        return
+    if job.state() == "queued":
+        st.info(f"En cola: esperando a que terminen {jobs.ahead(job)} render(s) anteriores")
+    elif job.state() == "running":
+        st.progress(job.done / job.total, text=f"Renderizando en segundo plano: {job.done}/{job.total} fotogramas")
+    elif st.session_state.get("morph_shown") != keys:
+        # Terminó: un rerun completo para mostrar los videos
+        st.session_state["morph_shown"] = keys
+        st.rerun()
+
+
+last_render = st.session_state.get("morph_job")
+if last_render:
+    job = jobs.get(last_render["keys"])
+    show_render_status(last_render["keys"])
+    if job is not None and job.state() == "error":
+        st.error(f"Error al generar video: {job.future.exception()}")
+    elif job is not None and job.state() == "done":
+        st.success(f"¡Listo! ({last_render['label']})")
+        paths = [renders.get(key) for key in last_render["keys"]]
+        if paths[0]:
+            st.video(paths[0])
+        for path, (w, h) in zip(paths, last_render["sizes"]):
+            if path:
+                with open(path, "rb") as f:
+                    st.download_button(
+                        f"Descargar MP4 {w}×{h}", f, f"morphing_video_{w}x{h}.mp4", "video/mp4", key=f"dl_{w}x{h}",
+                    )
 
-    img1 = Image.open(f1).convert("RGB")
-    img2 = Image.open(f2).convert("RGB")
-
-    base_size = img1.size if auto_size else (int(width), int(height))
-    img1 = img1.resize(base_size, Image.LANCZOS)
-    img2 = img2.resize(base_size, Image.LANCZOS)
-
-    img1_np = np.array(img1, dtype=np.float32)
-    img2_np = np.array(img2, dtype=np.float32)
-
-    frames = []
-    prog = st.progress(0.0)
-    for i in range(frame_count):
-        alpha = i / (frame_count - 1)
-        blended = ((1 - alpha) * img1_np + alpha * img2_np).astype(np.uint8)
-        frames.append(blended)
-        prog.progress((i + 1) / frame_count)
-
-    # Guardar MP4 con imageio (usa ffmpeg interno)
-    tmp = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-    with imageio.get_writer(tmp.name, fps=fps, codec="libx264") as writer:
-        for fr in frames:
-            writer.append_data(fr)
-
-    st.success("¡Listo!")
-    st.video(tmp.name)
-    with open(tmp.name, "rb") as f:
-        st.download_button("Descargar MP4", f, "morphing_video.mp4", "video/mp4")
-
-    st.caption("Vista previa")
-    st.image([img1, img2], caption=["Inicial", "Final"], width=260)
+st.caption("Imágenes")
+st.image([img1, img2], caption=["Inicial", "Final"], width=260)
@@ -1,10 +1,10 @@
 import streamlit as st
-import numpy as np
 from PIL import Image
-import imageio
 import tempfile
 import os
 
+from morph_pipeline import crossfade_frames, landmark_pairs, morph_frames, write_video, write_video_with_audio
+
 st.set_page_config(page_title="Morphing simple (crossfade)", page_icon="🎬")
 st.title("Morphing entre dos imágenes (crossfade) con audio opcional")
 
@@ -17,7 +17,19 @@ with col2:
 with st.expander("Audio (opcional)"):
     audio_file = st.file_uploader("Archivo de audio (mp3, wav)", type=["mp3", "wav"])
     youtube_url = st.text_input("O pega un link de YouTube (requiere pytube)")
-    st.caption("La mezcla de audio requiere moviepy. YouTube requiere pytube.")
+    st.caption("El audio se recorta a la duración del video y se mezcla con ffmpeg. YouTube requiere pytube.")
+
+with st.expander("Modo"):
+    modo = st.radio("Tipo de transición", ["Crossfade", "Morph con puntos de referencia"])
+    if modo != "Crossfade":
+        st.caption("Puntos correspondientes en ambas imágenes, en pixeles de la imagen subida: "
+                   "uno por línea como x,y (ojos, nariz, boca...). Los bordes se agregan solos.")
+        auto_points = st.checkbox("Detectar puntos de la cara (requiere mediapipe)", False)
+        pcol1, pcol2 = st.columns(2)
+        with pcol1:
+            points_text1 = st.text_area("Puntos imagen inicial", disabled=auto_points)
+        with pcol2:
+            points_text2 = st.text_area("Puntos imagen final", disabled=auto_points)
 
 with st.expander("Parámetros de video"):
     frame_count = st.slider("Número de fotogramas", 30, 600, 250, 10)
@@ -29,65 +41,65 @@ with st.expander("Parámetros de video"):
 
 generate = st.button("Generar video", disabled=not (img1_file and img2_file))
 
-def download_youtube_audio(url, output_path):
+# Descarga la pista de audio de YouTube tal cual (mp4/webm); ffmpeg la lee y
+# la recorta directamente al mezclar, sin convertirla antes
+def download_youtube_audio(url):
     from pytube import YouTube
-    from moviepy.editor import AudioFileClip
     yt = YouTube(url)
     stream = yt.streams.filter(only_audio=True).order_by('abr').desc().first()
-    temp_mp4 = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False).name
-    stream.download(output_path=os.path.dirname(temp_mp4), filename=os.path.basename(temp_mp4))
-    clip = AudioFileClip(temp_mp4)
-    clip.write_audiofile(output_path)
-    clip.close()
-    os.remove(temp_mp4)
-    return output_path
+    temp_audio = tempfile.NamedTemporaryFile(suffix="." + stream.subtype, delete=False).name
+    stream.download(output_path=os.path.dirname(temp_audio), filename=os.path.basename(temp_audio))
+    return temp_audio
 
 if generate:
     try:
         img1 = Image.open(img1_file).convert("RGB")
         img2 = Image.open(img2_file).convert("RGB")
         target_size = img1.size if auto_size else (int(width), int(height))
+        if modo != "Crossfade":
+            points1, points2 = landmark_pairs(img1, img2, target_size, points_text1, points_text2, auto_points)
         img1 = img1.resize(target_size, Image.LANCZOS)
         img2 = img2.resize(target_size, Image.LANCZOS)
-
-        arr1, arr2 = np.array(img1, float), np.array(img2, float)
-        frames = []
-        prog = st.progress(0.0)
-        for i in range(frame_count):
-            alpha = i/(frame_count-1) if frame_count > 1 else 1
-            frame = ((1-alpha)*arr1 + alpha*arr2).astype(np.uint8)
-            frames.append(frame)
-            prog.progress((i+1)/frame_count)
-
-        tmp_vid = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False).name
-        with imageio.get_writer(tmp_vid, fps=fps, codec="libx264") as writer:
-            for fr in frames:
-                writer.append_data(fr)
-        final_path = tmp_vid
-
     except Exception as e:
-        st.error(f"Error al generar video: {e}") 
+        st.error(f"Error al generar video: {e}")
         st.stop()
 
-    # Audio
-    if audio_file or youtube_url:
+    def make_frames():
+        if modo == "Crossfade":
+            return crossfade_frames(img1, img2, frame_count)
+        return morph_frames(img1, img2, points1, points2, frame_count)
+
+    # Audio: los bytes subidos van a ffmpeg por un pipe, YouTube como archivo
+    audio = None
+    youtube_audio = None
+    if youtube_url:
         try:
-            from moviepy.editor import VideoFileClip, AudioFileClip
-            if youtube_url:
-                tmp_audio = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False).name
-                tmp_audio = download_youtube_audio(youtube_url, tmp_audio)
-            else:
-                tmp_audio = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False).name
-                with open(tmp_audio, 'wb') as af:
-                    af.write(audio_file.read())
-            video_clip = VideoFileClip(final_path)
-            audio_clip = AudioFileClip(tmp_audio).subclip(0, video_clip.duration)
-            merged = video_clip.set_audio(audio_clip)
-            out_file = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False).name
-            merged.write_videofile(out_file, codec="libx264", audio_codec="aac")
-            final_path = out_file
+            youtube_audio = audio = download_youtube_audio(youtube_url)
         except Exception as e:
-            st.warning(f"No se pudo procesar audio, se entrega video sin sonido. (Error: {e})")
+            st.warning(f"No se pudo descargar el audio de YouTube, se entrega video sin sonido. (Error: {e})")
+    elif audio_file:
+        audio = audio_file.getvalue()
+
+    # Fotogramas generados de uno en uno y enviados directo al codificador; con
+    # audio, video y sonido salen de una sola pasada de ffmpeg
+    final_path = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False).name
+    prog = st.progress(0.0)
+    on_progress = lambda done, total: prog.progress(min(done/total, 1.0))
+    try:
+        if audio is not None:
+            try:
+                write_video_with_audio(make_frames(), final_path, fps, frame_count, audio, progress=on_progress)
+            except Exception as e:
+                st.warning(f"No se pudo procesar audio, se entrega video sin sonido. (Error: {e})")
+                write_video(make_frames(), final_path, fps, frame_count, progress=on_progress)
+        else:
+            write_video(make_frames(), final_path, fps, frame_count, progress=on_progress)
+    except Exception as e:
+        st.error(f"Error al generar video: {e}")
+        st.stop()
+    finally:
+        if youtube_audio:
+            os.remove(youtube_audio)
 
     st.success("¡Video generado!")
     st.video(final_path)
@@ -0,0 +1,288 @@
+# Offline batch transcription of a directory of long piano recordings, chords
+# included. Every file is split into chunks that worker processes read with
+# soundfile block reads; each chunk's spectra are decomposed against one
+# spectral template per key (C3-B6), built from the timbre of the recorded
+# samples in piano_notes/notes. Note events go to one compact columnar file
+# per recording (Parquet, or compressed .npz without pyarrow).
+#
+#   python batch_transcribe.py recordings/ --out transcriptions/ --workers 8
+import argparse
+import glob
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
+import soundfile as sf
+
+from pitch_tracker import HIGHEST_NOTE, LOWEST_NOTE, PitchTracker, frame_blocks
+from sample_bank import bank, note_frequency, note_name
+
+WINDOW_SECONDS = 0.15  # rounded up to a power of two in samples: 8192 at 44.1 kHz
+HOPS_PER_WINDOW = 4
+CHUNK_SECONDS = 30  # audio per worker task
+BLOCK = 65536  # samples per soundfile read inside a chunk
+
+HARMONICS = 10
+NMF_ITERATIONS = 40
+RELATIVE_THRESHOLD = 0.5  # share of the frame's strongest note a note needs to count as sounding
+QUIET_THRESHOLD = 0.18  # lower share for notes that are not overtones / undertones of a stronger one
+SILENCE_DB = -50  # frames quieter than this (dBFS RMS) have no notes
+MIN_FRAMES = 4  # shorter events are dropped (~0.19 s at 44.1 kHz)
+CHORD_FRAMES = 1  # events starting within this many frames of each other form a chord
+
+# Spectra are folded onto semitone bins from the lowest key up to where the
+# templates' harmonics end
+PITCH_LOW = LOWEST_NOTE - 1
+PITCH_HIGH = HIGHEST_NOTE + 40
+
+# Semitones above a note where its strongest overtones land (octave, octave +
+# fifth, two octaves), and below it where template mismatch puts undertones
+OVERTONES = (12, 19, 24)
+UNDERTONES = (12, 19)
+
+FileResult = namedtuple('FileResult', ['path', 'output', 'seconds', 'events', 'chords'])
+
+
+def window_size(samplerate):
+    return 1 << int(np.ceil(np.log2(samplerate * WINDOW_SECONDS)))
+
+
+# Harmonic amplitude profile of every recorded sample, keyed by the pitch it
+# actually sounds at (measured, not taken from the file name)
+@lru_cache(maxsize=None)
+def harmonic_profiles():
+    profiles = {}
+    for midi in sorted(bank.files()):
+        samples, samplerate = bank.sample(note_name(midi))
+        x = samples.mean(axis=1).astype(np.float32) / 32768
+        head = x[:samplerate // 2]
+        notes = [n for batch in PitchTracker(samplerate).track([head]) for n in batch.notes.tolist() if n >= 0]
+        if not notes:
+            continue
+        sounded = max(set(notes), key=notes.count)
+        n = 1 << 15
+        spectrum = np.abs(np.fft.rfft(head * np.hanning(len(head)), n))
+        freqs = np.fft.rfftfreq(n, 1 / samplerate)
+        band = (freqs > note_frequency(sounded - 0.5)) & (freqs < note_frequency(sounded + 0.5))
+        f0 = freqs[band][np.argmax(spectrum[band])]
+        amps = np.zeros(HARMONICS)
+        for k in range(1, HARMONICS + 1):
+            near = (freqs > k * f0 * 0.98) & (freqs < k * f0 * 1.02)
+            if near.any() and k * f0 * 1.02 < samplerate / 2:
+                amps[k - 1] = spectrum[near].max()
+        profiles[sounded] = amps / amps.max()
+    if not profiles:  # no samples: a plain 1/k series
+        profiles[LOWEST_NOTE] = 1 / np.arange(1, HARMONICS + 1)
+    return profiles
+
+
+# Semitone folding matrix (rfft bins x pitch bins)
+@lru_cache(maxsize=8)
+def pitch_folding(samplerate, window):
+    freqs = np.fft.rfftfreq(window, 1 / samplerate)[1:]
+    pitch = np.rint(69 + 12 * np.log2(freqs / 440)).astype(int) - PITCH_LOW
+    fold = np.zeros((window // 2 + 1, PITCH_HIGH - PITCH_LOW + 1), dtype=np.float32)
+    valid = (pitch >= 0) & (pitch < fold.shape[1])
+    fold[1:][valid, pitch[valid]] = 1
+    return fold
+
+
+# Folded magnitude spectra of a batch of (n, window) frames
+def folded_spectra(frames, taper, fold):
+    return np.abs(np.fft.rfft(frames * taper, axis=1)).astype(np.float32) @ fold
+
+
+# One unit-norm template per key: a tone with the harmonic profile of the
+# nearest recorded sample, run through the same analysis as the recordings
+@lru_cache(maxsize=8)
+def note_templates(samplerate, window):
+    profiles = harmonic_profiles()
+    t = np.arange(window) / samplerate
+    taper = np.hanning(window).astype(np.float32)
+    tones = []
+    for midi in range(LOWEST_NOTE, HIGHEST_NOTE + 1):
+        amps = profiles[min(profiles, key=lambda m: (abs(m - midi), m))]
+        f0 = note_frequency(midi)
+        tone = sum(a * np.sin(2 * np.pi * k * f0 * t) for k, a in enumerate(amps, 1) if a and k * f0 < samplerate / 2)
+        tones.append(tone)
+    templates = folded_spectra(np.array(tones, dtype=np.float32), taper, pitch_folding(samplerate, window))
+    return templates / np.linalg.norm(templates, axis=1, keepdims=True)
+
+
+# Non-negative activations of the templates W that best explain spectra V:
+# multiplicative updates for the KL divergence with the templates fixed, which
+# gives sparser note sets than least squares
+def activations(V, W, iterations=NMF_ITERATIONS):
+    H = np.full((len(V), len(W)), V.sum(axis=1, keepdims=True).mean() / len(W) + 1e-6, dtype=np.float32)
+    norm = W.sum(axis=1)
+    for _ in range(iterations):
+        H *= ((V / (H @ W + 1e-9)) @ W.T) / norm
+    return H
+
+
+# Worker task: note strengths (frames, keys) of `frames` analysis frames
+# starting at sample `start`. Module level so it can run in a worker process.
+def analyze_chunk(path, start, frames):
+    with sf.SoundFile(path) as f:
+        samplerate = f.samplerate
+        window = window_size(samplerate)
+        hop = window // HOPS_PER_WINDOW
+        length = min((frames - 1) * hop + window, f.frames - start)
+        f.seek(start)
+        blocks = (b.mean(axis=1) for b in f.blocks(blocksize=BLOCK, frames=length, dtype='float32', always_2d=True))
+        taper = np.hanning(window).astype(np.float32)
+        fold = pitch_folding(samplerate, window)
+        spectra, loudness = [], []
+        for _, batch in frame_blocks(blocks, window, hop):
+            spectra.append(folded_spectra(batch, taper, fold))
+            loudness.append(np.sqrt(np.mean(batch * batch, axis=1)))
+    if not spectra:
+        return np.zeros((0, HIGHEST_NOTE - LOWEST_NOTE + 1), dtype=np.float16)
+    V = np.concatenate(spectra)
+    H = activations(V, note_templates(samplerate, window))
+    strongest = H.max(axis=1, keepdims=True)
+    loud = np.concatenate(loudness)[:, None] >= 10 ** (SILENCE_DB / 20)
+    sounding = loud & ((H >= RELATIVE_THRESHOLD * strongest) | (quiet_notes(H) & (H >= QUIET_THRESHOLD * strongest)))
+    return np.where(sounding, H / np.maximum(strongest, 1e-12), 0).astype(np.float16)
+
+
+# Keys of H (frames, keys) that may be real quiet notes rather than leakage
+# from a louder one: at least as strong as both semitone neighbours (a slightly
+# detuned note spills into them) and as every note it could be an overtone or
+# undertone of. This keeps e.g. a softly voiced top note of a triad.
+def quiet_notes(H):
+    keys, pad = H.shape[1], max(OVERTONES + UNDERTONES)
+    padded = np.pad(H, ((0, 0), (pad, pad)))
+
+    def shifted(semitones):  # H of the key `semitones` above each key
+        return padded[:, pad + semitones:pad + semitones + keys]
+
+    related = [shifted(1), shifted(-1)] + [shifted(-i) for i in OVERTONES] + [shifted(i) for i in UNDERTONES]
+    return H >= np.max(related, axis=0)
+
+
+# Runs of sounding frames per key -> event columns sorted by start, with a
+# chord id shared by events that start together
+def note_events(strength, seconds_per_frame, offset_seconds):
+    notes, starts, ends, levels = [], [], [], []
+    for key in range(strength.shape[1]):
+        on = np.concatenate([[False], strength[:, key] > 0, [False]])
+        edges = np.flatnonzero(on[1:] != on[:-1])
+        for first, stop in zip(edges[::2], edges[1::2]):
+            if stop - first < MIN_FRAMES:
+                continue
+            notes.append(LOWEST_NOTE + key)
+            starts.append(first)
+            ends.append(stop)
+            levels.append(float(strength[first:stop, key].astype(np.float32).mean()))
+    order = np.lexsort((notes, starts))
+    start_frames = np.array(starts, dtype=np.int64)[order]
+    chord = np.cumsum(np.diff(start_frames, prepend=-CHORD_FRAMES - 1) > CHORD_FRAMES) - 1
+    return {
+        'note': np.array(notes, dtype=np.uint8)[order],
+        'start': (start_frames * seconds_per_frame + offset_seconds).astype(np.float32),
+        'end': (np.array(ends, dtype=np.int64)[order] * seconds_per_frame + offset_seconds).astype(np.float32),
+        'strength': np.array(levels, dtype=np.float32)[order],
+        'chord': chord.astype(np.int32),
+    }
+
+
+# Parquet when pyarrow is available, compressed .npz otherwise
+def write_events(columns, base_path):
+    try:
+        import pandas as pd
+        path = f'{base_path}.parquet'
+        pd.DataFrame(columns).to_parquet(path, index=False)
+    except ImportError:
+        path = f'{base_path}.npz'
+        np.savez_compressed(path, **columns)
+    return path
+
+
+# Chunk boundaries of one file as (start sample, analysis frames) pairs;
+# chunks start on hop boundaries so frames line up across chunks
+def file_chunks(path, chunk_seconds=CHUNK_SECONDS):
+    info = sf.info(path)
+    window = window_size(info.samplerate)
+    hop = window // HOPS_PER_WINDOW
+    total = max(0, (info.frames - window) // hop + 1)
+    per_chunk = max(1, int(chunk_seconds * info.samplerate) // hop)
+    return info, [(first * hop, min(per_chunk, total - first)) for first in range(0, total, per_chunk)]
+
+
+# Transcribe every .wav in `directory` into `out_dir`. Chunks of all files go
+# to one process pool; a file is written as soon as its last chunk is back.
+# progress(chunks_done, chunks_total) is called after every chunk.
+def transcribe_directory(directory, out_dir, workers=None, chunk_seconds=CHUNK_SECONDS, progress=None):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = sorted(glob.glob(os.path.join(directory, '*.wav')))
+    plans = {path: file_chunks(path, chunk_seconds) for path in paths}
+    total = sum(len(chunks) for _, chunks in plans.values())
+
+    results = []
+    parts = {path: {} for path in paths}
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(analyze_chunk, path, start, frames): (path, i)
+            for path, (_, chunks) in plans.items()
+            for i, (start, frames) in enumerate(chunks)
+        }
+        for path, (info, chunks) in plans.items():
+            if not chunks:  # shorter than one window
+                results.append(_finish(path, info, [], out_dir))
+        for future in as_completed(futures):
+            path, i = futures[future]
+            parts[path][i] = future.result()
+            done += 1
+            if progress:
+                progress(done, total)
+            info, chunks = plans[path]
+            if len(parts[path]) == len(chunks):
+                results.append(_finish(path, info, [parts[path][k] for k in range(len(chunks))], out_dir))
+                del parts[path]
+    return sorted(results)
+
+
+def _finish(path, info, strengths, out_dir):
+    window = window_size(info.samplerate)
+    hop = window // HOPS_PER_WINDOW
+    strength = np.concatenate(strengths) if strengths else np.zeros((0, HIGHEST_NOTE - LOWEST_NOTE + 1))
+    # Frame i covers samples [i * hop, i * hop + window); events are reported
+    # around the window centres
+    columns = note_events(strength, hop / info.samplerate, (window - hop) / 2 / info.samplerate)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    output = write_events(columns, os.path.join(out_dir, stem))
+    chords = int(np.count_nonzero(np.bincount(columns['chord']) > 1)) if len(columns['chord']) else 0
+    return FileResult(path, output, info.frames / info.samplerate, len(columns['note']), chords)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch piano transcription of a directory of WAV recordings')
+    parser.add_argument('directory')
+    parser.add_argument('--out', help='output directory (default: <directory>/transcriptions)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--chunk-seconds', type=float, default=CHUNK_SECONDS)
+    args = parser.parse_args()
+    out_dir = args.out or os.path.join(args.directory, 'transcriptions')
+
+    start = time.perf_counter()
+    results = transcribe_directory(
+        args.directory, out_dir, args.workers, args.chunk_seconds,
+        progress=lambda done, total: print(f'\r{done}/{total} chunks', end='', flush=True),
+    )
+    elapsed = time.perf_counter() - start
+    print()
+
+    audio = sum(r.seconds for r in results)
+    print(f'{len(results)} files, {audio / 60:.1f} min of audio in {elapsed:.1f}s '
+          f'({audio / max(elapsed, 1e-9):.0f}x real time)')
+    for r in results:
+        print(f'{os.path.basename(r.path)}: {r.events} notes, {r.chords} chords -> {r.output}')
+
+
+if __name__ == '__main__':
+    main()
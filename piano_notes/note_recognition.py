@@ -1,67 +1,23 @@
+import pandas as pd
 import streamlit as st
-import soundfile as sf
-from pathlib import Path
 
-# Define the notes and their corresponding files
-NOTE_FILES = {
-    'C3': 'notes/c3.wav',
-    'C#3': 'notes/c_sharp_3.wav',
-    'D3': 'notes/d3.wav',
-    'D#3': 'notes/d_sharp_3.wav',
-    'E3': 'notes/e3.wav',
-    'F3': 'notes/f3.wav',
-    'F#3': 'notes/f_sharp_3.wav',
-    'G3': 'notes/g3.wav',
-    'G#3': 'notes/g_sharp_3.wav',
-    'A3': 'notes/a3.wav',
-    'A#3': 'notes/a_sharp_3.wav',
-    'B3': 'notes/b3.wav',
-    'C4': 'notes/c4.wav',
-    'C#4': 'notes/c_sharp_4.wav',
-    'D4': 'notes/d4.wav',
-    'D#4': 'notes/d_sharp_4.wav',
-    'E4': 'notes/e4.wav',
-    'F4': 'notes/f4.wav',
-    'F#4': 'notes/f_sharp_4.wav',
-    'G4': 'notes/g4.wav',
-    'G#4': 'notes/g_sharp_4.wav',
-    'A4': 'notes/a4.wav',
-    'A#4': 'notes/a_sharp_4.wav',
-    'B4': 'notes/b4.wav',
-    'C5': 'notes/c5.wav',
-    'C#5': 'notes/c_sharp_5.wav',
-    'D5': 'notes/d5.wav',
-    'D#5': 'notes/d_sharp_5.wav',
-    'E5': 'notes/e5.wav',
-    'F5': 'notes/f5.wav',
-    'F#5': 'notes/f_sharp_5.wav',
-    'G5': 'notes/g5.wav',
-    'G#5': 'notes/g_sharp_5.wav',
-    'A5': 'notes/a5.wav',
-    'A#5': 'notes/a_sharp_5.wav',
-    'B5': 'notes/b5.wav',
-    'C6': 'notes/c6.wav',
-    'C#6': 'notes/c_sharp_6.wav',
-    'D6': 'notes/d6.wav',
-    'D#6': 'notes/d_sharp_6.wav',
-    'E6': 'notes/e6.wav',
-    'F6': 'notes/f6.wav',
-    'F#6': 'notes/f_sharp_6.wav',
-    'G6': 'notes/g6.wav',
-    'G#6': 'notes/g_sharp_6.wav',
-    'A6': 'notes/a6.wav',
-    'A#6': 'notes/a_sharp_6.wav',
-    'B6': 'notes/b6.wav'
-}
+from pitch_tracker import NoteEvent, recognize
+from sample_bank import bank, note_name
 
-# Function to play a note
+# Function to play a note: recorded notes come from piano_notes/notes, the
+# rest are pitch-shifted from the nearest recording. Both are decoded once and
+# served from memory.
 def play_note(note):
-    file = NOTE_FILES.get(note)
-    if file and Path(file).exists():
-        st.audio(file, format='audio/wav')
+    try:
+        audio = bank.wav_bytes(note)
+    except KeyError:
+        st.write(f"File not found for note: {note}")
+        return
+    st.audio(audio, format='audio/wav')
+    if bank.recorded(note):
         st.write(f"Playing: {note}")
     else:
-        st.write(f"File not found for note: {note}")
+        st.write(f"Playing: {note} (synthesized from the {note_name(bank.source_for(note))} sample)")
 
 # Create the piano keys
 keys = []
@@ -69,10 +25,41 @@ for octave in range(3, 7):
     for key in ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']:
         keys.append(f'{key}{octave}')
 
-# Create the piano interface
-st.title("Piano App")
-cols = st.columns(len(keys))
-for i, note in enumerate(keys):
-    with cols[i]:
-        if st.button(note):
-            play_note(note)
+mode = st.sidebar.radio("Mode", ["Play", "Recognize"])
+
+if mode == "Play":
+    # Create the piano interface
+    st.title("Piano App")
+    cols = st.columns(len(keys))
+    for i, note in enumerate(keys):
+        with cols[i]:
+            if st.button(note):
+                play_note(note)
+else:
+    # Recognition: the recording is read block by block and analysed in
+    # overlapping windows, so full practice sessions fit in constant memory
+    st.title("Note Recognition")
+    st.caption(f"Detects single notes from {keys[0]} to {keys[-1]}.")
+    uploaded = st.file_uploader("Audio file", type=["wav", "flac", "ogg", "mp3"])
+    recorded = st.audio_input("Or record")
+    audio = uploaded or recorded
+    if st.button("Recognize notes", disabled=audio is None):
+        bar = st.progress(0.0)
+        try:
+            events, duration, elapsed = recognize(
+                audio, progress=lambda done, total: bar.progress(min(done / total, 1.0)),
+            )
+        except RuntimeError as e:  # soundfile can't decode the file
+            st.error(f"Could not read the audio: {e}")
+            st.stop()
+        st.write(
+            f"{len(events)} notes in {duration:.1f} s of audio, analysed in {elapsed:.2f} s "
+            f"({duration / max(elapsed, 1e-9):.0f}x real time)"
+        )
+        if events:
+            timeline = pd.DataFrame(events, columns=NoteEvent._fields)
+            timeline['duration'] = timeline['end'] - timeline['start']
+            st.dataframe(timeline.style.format({
+                'start': '{:.2f}', 'end': '{:.2f}', 'duration': '{:.2f}', 'confidence': '{:.2f}',
+            }))
+            st.scatter_chart(timeline, x='start', y='note', size='duration')
@@ -0,0 +1,143 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+import soundfile as sf
+
+from sample_bank import midi_number, note_frequency, note_name
+
+# Range of the piano keys in note_recognition.py
+LOWEST_NOTE = midi_number('C3')
+HIGHEST_NOTE = midi_number('B6')
+
+WINDOW = 2048  # samples per analysis window
+HOP = 512  # samples between window starts
+BLOCK = 65536  # samples read from the file at a time; bounds memory for long recordings
+
+VOICING_THRESHOLD = 0.6  # normalized autocorrelation peak needed to call a window pitched
+OCTAVE_TOLERANCE = 0.9  # shortest period whose peak is this close to the best wins (avoids octave-down errors)
+SILENCE_DB = -60  # windows quieter than this (dBFS RMS) are silent
+MIN_DURATION = 0.06  # seconds; shorter notes are dropped from the timeline
+
+# One window: centre time in seconds, MIDI note (-1 = none) and confidence
+PitchFrames = namedtuple('PitchFrames', ['times', 'notes', 'confidence'])
+
+# One note of the timeline
+NoteEvent = namedtuple('NoteEvent', ['note', 'start', 'end', 'confidence'])
+
+
+# Autocorrelation pitch detector for batches of overlapping windows. The taper,
+# its own autocorrelation (to undo the taper's decay, Boersma style), the lag
+# range of the note range and the note boundaries are computed once per
+# sample rate.
+class PitchTracker:
+    def __init__(self, samplerate, window=WINDOW, hop=HOP, low=LOWEST_NOTE, high=HIGHEST_NOTE):
+        self.samplerate = samplerate
+        self.window = window
+        self.hop = hop
+        self.nfft = 1 << (2 * window - 1).bit_length()
+
+        self.taper = np.hanning(window).astype(np.float32)
+        taper_ac = np.fft.irfft(np.abs(np.fft.rfft(self.taper, self.nfft)) ** 2, self.nfft)
+        half_step = 2 ** (0.5 / 12)
+        self.min_lag = max(2, int(samplerate / (note_frequency(high) * half_step)))
+        self.max_lag = min(window // 2, int(np.ceil(samplerate / (note_frequency(low) / half_step))))
+        self.taper_ac = (taper_ac[:self.max_lag + 2] / taper_ac[0]).astype(np.float32)
+
+        # Note lookup: frequency -> index in self.notes via the half-step boundaries
+        self.notes = np.arange(low, high + 1)
+        self.edges = note_frequency(np.arange(low, high + 2) - 0.5)
+        self.silence = 10 ** (SILENCE_DB / 20)
+
+    # (n, window) float32 frames -> (notes, confidence), both (n,)
+    def analyze(self, frames):
+        x = frames - frames.mean(axis=1, keepdims=True)
+        rms = np.sqrt(np.mean(x * x, axis=1))
+        x *= self.taper
+        spectrum = np.fft.rfft(x, self.nfft, axis=1)
+        ac = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, self.nfft, axis=1)[:, :self.max_lag + 2]
+        energy = np.maximum(ac[:, :1], 1e-12)
+        r = ac / (energy * self.taper_ac)
+
+        # Local maxima of the normalized autocorrelation inside the lag range
+        lo, hi = self.min_lag, self.max_lag
+        mid = r[:, lo:hi + 1]
+        peaks = (mid >= r[:, lo - 1:hi]) & (mid > r[:, lo + 1:hi + 2])
+        values = np.where(peaks, mid, -np.inf)
+        best = values.max(axis=1)
+        first = np.argmax(values >= OCTAVE_TOLERANCE * best[:, None], axis=1)
+
+        # Parabolic interpolation around the chosen lag
+        rows = np.arange(len(r))
+        lag = lo + first
+        left, centre, right = r[rows, lag - 1], r[rows, lag], r[rows, lag + 1]
+        denom = left - 2 * centre + right
+        offset = np.where(denom < 0, 0.5 * (left - right) / np.where(denom < 0, denom, -1), 0.0)
+        frequency = self.samplerate / (lag + offset)
+
+        index = np.searchsorted(self.edges, frequency) - 1
+        voiced = (best >= VOICING_THRESHOLD) & (rms >= self.silence) & (index >= 0) & (index < len(self.notes))
+        notes = np.where(voiced, self.notes[np.clip(index, 0, len(self.notes) - 1)], -1)
+        return notes, np.where(voiced, np.clip(best, 0, 1), 0.0)
+
+    # Mono float32 blocks of any length -> PitchFrames per block
+    def track(self, blocks):
+        for start, frames in frame_blocks(blocks, self.window, self.hop):
+            notes, confidence = self.analyze(frames)
+            times = (start + np.arange(len(frames)) * self.hop + self.window / 2) / self.samplerate
+            yield PitchFrames(times, notes, confidence)
+
+
+# Overlapping windows over a stream of mono blocks of any length: yields
+# (sample index of the first window, (n, window) view) per block. Only the
+# samples of the last, incomplete window are carried over between blocks.
+def frame_blocks(blocks, window, hop):
+    pending = np.zeros(0, dtype=np.float32)
+    start = 0  # sample index of pending[0]
+    for block in blocks:
+        buffer = np.concatenate([pending, block])
+        count = (len(buffer) - window) // hop + 1
+        if count <= 0:
+            pending = buffer
+            continue
+        yield start, np.lib.stride_tricks.sliding_window_view(buffer, window)[::hop][:count]
+        consumed = count * hop
+        pending = buffer[consumed:]
+        start += consumed
+
+
+# Merge consecutive windows with the same note into NoteEvents, streaming:
+# an event is yielded as soon as its note ends
+def timeline(frames, hop_seconds, min_duration=MIN_DURATION):
+    current, begin, last, total, count = -1, 0.0, 0.0, 0.0, 0
+    for batch in frames:
+        for t, note, conf in zip(batch.times.tolist(), batch.notes.tolist(), batch.confidence.tolist()):
+            if note == current:
+                last, total, count = t, total + conf, count + 1
+                continue
+            if current >= 0 and last - begin + hop_seconds >= min_duration:
+                yield NoteEvent(note_name(current), begin - hop_seconds / 2, last + hop_seconds / 2, total / count)
+            current, begin, last, total, count = note, t, t, conf, 1
+    if current >= 0 and last - begin + hop_seconds >= min_duration:
+        yield NoteEvent(note_name(current), begin - hop_seconds / 2, last + hop_seconds / 2, total / count)
+
+
+# Note timeline of an audio file (path or file-like), read block by block so
+# memory stays flat for long recordings. progress(seconds_done, seconds_total)
+# is called after every block. Returns (events, audio seconds, processing seconds).
+def recognize(file, progress=None, window=WINDOW, hop=HOP, block=BLOCK):
+    started = time.perf_counter()
+    with sf.SoundFile(file) as f:
+        samplerate, total = f.samplerate, f.frames
+        tracker = PitchTracker(samplerate, window, hop)
+
+        def mono_blocks():
+            done = 0
+            for data in f.blocks(blocksize=block, dtype='float32', always_2d=True):
+                done += len(data)
+                yield data.mean(axis=1)
+                if progress:
+                    progress(done / samplerate, total / samplerate)
+
+        events = list(timeline(tracker.track(mono_blocks()), hop / samplerate))
+    return events, total / samplerate, time.perf_counter() - started
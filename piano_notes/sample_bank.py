@@ -0,0 +1,127 @@
+import io
+import os
+import re
+import threading
+
+import numpy as np
+import soundfile as sf
+
+NOTES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'notes')
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Sample files are named like c6.wav / c_sharp_6.wav
+FILE_PATTERN = re.compile(r'^([a-g])(_sharp)?_?(\d)\.wav$')
+
+# Synthesized notes keep the length of the sample they come from and fade out
+# over the last FADE_SECONDS instead of stopping abruptly
+FADE_SECONDS = 0.05
+
+
+# 'C#4' -> 61 (MIDI numbering, A4 = 69)
+def midi_number(note):
+    name, octave = note[:-1], int(note[-1])
+    return 12 * (octave + 1) + NOTE_NAMES.index(name)
+
+
+def note_name(midi):
+    return f'{NOTE_NAMES[midi % 12]}{midi // 12 - 1}'
+
+
+def note_frequency(midi):
+    return 440.0 * 2 ** ((midi - 69) / 12)
+
+
+def note_from_file_name(file_name):
+    match = FILE_PATTERN.match(file_name.lower())
+    if not match:
+        return None
+    letter, sharp, octave = match.groups()
+    return f"{letter.upper()}{'#' if sharp else ''}{octave}"
+
+
+# Pitch shift by resampling: the sample is read `ratio` times faster, cut to
+# its original length and faded out
+def pitch_shift(samples, samplerate, ratio):
+    frames = len(samples)
+    positions = np.arange(0, frames - 1, ratio)[:frames]
+    source = np.arange(frames)
+    shifted = np.column_stack([
+        np.interp(positions, source, samples[:, channel]) for channel in range(samples.shape[1])
+    ])
+    fade = min(len(shifted), int(FADE_SECONDS * samplerate))
+    if fade:
+        shifted[-fade:] *= np.linspace(1.0, 0.0, fade)[:, None]
+    return shifted
+
+
+# Piano samples: the notes directory is scanned once, files are decoded on
+# first use and kept as int16, and notes without a recording are synthesized
+# from the nearest recorded one. Encoded WAV bytes are cached too, so playing
+# a key never touches the filesystem again.
+class SampleBank:
+    def __init__(self, directory=NOTES_DIR):
+        self.directory = directory
+        self._files = None
+        self._samples = {}
+        self._wav = {}
+        self._lock = threading.Lock()
+
+    # {midi number: path} of the recorded samples
+    def files(self):
+        if self._files is None:
+            files = {}
+            if os.path.isdir(self.directory):
+                for entry in os.scandir(self.directory):
+                    note = note_from_file_name(entry.name)
+                    if note:
+                        files[midi_number(note)] = entry.path
+            self._files = files
+        return self._files
+
+    def recorded(self, note):
+        return midi_number(note) in self.files()
+
+    # Nearest recorded note to `note` (the lower one on ties), None if there are no samples
+    def source_for(self, note):
+        midi = midi_number(note)
+        files = self.files()
+        if not files:
+            return None
+        return min(files, key=lambda m: (abs(m - midi), m))
+
+    # (int16 array of shape (frames, channels), samplerate), decoded or synthesized once
+    def sample(self, note):
+        midi = midi_number(note)
+        with self._lock:
+            if midi not in self._samples:
+                self._samples[midi] = self._load(midi)
+            return self._samples[midi]
+
+    def _load(self, midi):
+        files = self.files()
+        if midi in files:
+            return sf.read(files[midi], dtype='int16', always_2d=True)
+        source = self.source_for(note_name(midi))
+        if source is None:
+            raise KeyError(f'No samples available for {note_name(midi)}')
+        if source not in self._samples:
+            self._samples[source] = sf.read(files[source], dtype='int16', always_2d=True)
+        samples, samplerate = self._samples[source]
+        ratio = note_frequency(midi) / note_frequency(source)
+        shifted = pitch_shift(samples.astype(np.float32), samplerate, ratio)
+        return np.clip(np.rint(shifted), -32768, 32767).astype(np.int16), samplerate
+
+    # The note as a ready-to-play WAV file in memory
+    def wav_bytes(self, note):
+        midi = midi_number(note)
+        cached = self._wav.get(midi)
+        if cached is None:
+            samples, samplerate = self.sample(note)
+            buffer = io.BytesIO()
+            sf.write(buffer, samples, samplerate, format='WAV', subtype='PCM_16')
+            cached = self._wav.setdefault(midi, buffer.getvalue())
+        return cached
+
+
+bank = SampleBank()
@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+
+
+# Small thread-safe LRU cache shared by every session in the process.
+# Streamlit reruns the page script on each click, but this module is only
+# imported once, so whatever is stored here survives reruns and is shared
+# between users. Used by the dice calculator and the morphing app.
+class LRUCache:
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _lookup(self, key):
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, self._data[key]
+        return False, None
+
+    def get_or_compute(self, key, compute):
+        # Only sessions asking for the same key wait for the first result; the
+        # shared lock is never held while computing, so other keys stay served
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                found, value = self._lookup(key)
+                if found:
+                    return value
+                self.misses += 1
+            try:
+                value = compute()
+                with self._lock:
+                    self._data[key] = value
+                    if len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+            finally:
+                with self._lock:
+                    if self._key_locks.get(key) is key_lock:
+                        del self._key_locks[key]
+            return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0